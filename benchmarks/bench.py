@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Author: Mark Blakeney, Feb 2024.
+"""
+Benchmark pipxu overhead against synthetic homes of N applications.
+
+Generates a PIPXU_HOME with N venvs (each with dist-info, RECORD, an
+executable and a man page) for each given size, using the stub uv in
+fakeuv.py so no network or real uv is needed. Then times the pipxu
+commands and internal functions whose cost grows with the number of
+installed applications, so that scaling regressions stand out.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from pathlib import Path
+
+BENCHDIR = Path(__file__).resolve().parent
+ROOTDIR = BENCHDIR.parent
+FAKEUV = BENCHDIR / 'fakeuv.py'
+
+sys.path.insert(0, str(ROOTDIR))
+sys.path.insert(0, str(BENCHDIR))
+
+import fakeuv
+
+from pipxu import utils
+
+PROG = 'pipxu'
+DEFSIZES = '10,100,1000'
+
+
+def make_args(base: Path) -> Namespace:
+    "Return the namespace that pipxu.main.main() would pass to a command"
+    home_dir = base / 'home'
+    args = Namespace(uv=str(FAKEUV), verbose=False, no_man_pages=False)
+    args._uv = str(FAKEUV)
+    args._home_dir = home_dir
+    args._lockfile = home_dir / f'.{PROG}.lock'
+    args._locks_dir = home_dir / 'locks'
+    args._journal_dir = home_dir / 'journal'
+    args._packages_dir = home_dir / 'packages'
+    args._venvs_dir = home_dir / 'venvs'
+    args._bin_dir = base / 'bin'
+    args._man_dir = base / 'man'
+    args._pyexe = Path(sys.executable)
+    args._prog = PROG
+    args._meta_file = f'{PROG}_metadata.json'
+    args._freeze_file = f'{PROG}_freeze.txt'
+    args._links_file = f'{PROG}_links.txt'
+    args._keep_generations = 0
+    args._defer_compile = False
+    args.include_deps = False
+
+    for path in (args._packages_dir, args._venvs_dir, args._bin_dir, args._man_dir):
+        path.mkdir(parents=True, exist_ok=True)
+
+    return args
+
+
+def pkgname(num: int) -> str:
+    "Return the synthetic application name for the given number"
+    return f'app{num:05d}'
+
+
+def generate(args: Namespace, size: int) -> float:
+    "Create a synthetic home of size apps, return time spent in make_links()"
+    elapsed = 0.0
+    for num in range(1, size + 1):
+        name = pkgname(num)
+        vdir = args._venvs_dir / str(num)
+        fakeuv.make_venv(vdir)
+        fakeuv.write_package(vdir, name, fakeuv.PKG_VERSION, app=True)
+        fakeuv.write_package(
+            vdir, name + fakeuv.DEP_SUFFIX, fakeuv.PKG_VERSION, app=False
+        )
+        (args._packages_dir / name).symlink_to(vdir)
+
+        start = time.perf_counter()
+        if err := utils.make_links(vdir, name, args, {'name': name}):
+            sys.exit(err)
+        elapsed += time.perf_counter() - start
+
+    return elapsed
+
+
+def best(func, repeat: int) -> float:
+    "Return the best time of repeat calls to func"
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def pipxu(base: Path, *cmd: str) -> None:
+    "Run pipxu command as a subprocess against the synthetic home"
+    env = dict(os.environ, PYTHONPATH=str(ROOTDIR))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    res = subprocess.run(
+        [sys.executable, '-m', PROG, '--uv', str(FAKEUV)]
+        + ['--home', str(base / 'home'), '--bin-dir', str(base / 'bin')]
+        + ['--man-dir', str(base / 'man'), '--default-python', sys.executable]
+        + list(cmd),
+        check=False,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if res.returncode != 0:
+        sys.exit(f'Error: pipxu {" ".join(cmd)} failed:\n{res.stderr}')
+
+
+def bench(size: int, repeat: int, jobs: int | None) -> dict[str, float]:
+    "Run all benchmarks for a home of the given size"
+    results = {}
+    with tempfile.TemporaryDirectory(prefix=f'{PROG}-bench-') as tdir:
+        base = Path(tdir)
+        args = make_args(base)
+        results['make_links (initial)'] = generate(args, size)
+
+        # Warm up, e.g. compile pipxu byte code and cache uv version
+        pipxu(base, 'list')
+
+        for cmd in ('list', 'version', 'venv'):
+            results[cmd] = best(lambda cmd=cmd: pipxu(base, cmd), repeat)
+
+        upgrade = ['upgrade', '--all'] + (['-j', str(jobs)] if jobs else [])
+        results['upgrade --all'] = best(lambda: pipxu(base, *upgrade), repeat)
+
+        def relink():
+            for pkg, vdir, data in utils.get_all_pkg_venvs(args):
+                utils.make_links(vdir, pkg, args, data)
+
+        results['make_links (unchanged)'] = best(relink, repeat)
+        results['purge_old_files'] = best(lambda: utils.purge_old_files(args), repeat)
+
+    return results
+
+
+def main() -> str | None:
+    "Main code"
+    opt = argparse.ArgumentParser(description=__doc__)
+    opt.add_argument(
+        '-s',
+        '--sizes',
+        default=DEFSIZES,
+        help=f'comma separated list of number of apps, default="{DEFSIZES}"',
+    )
+    opt.add_argument(
+        '-r', '--repeat', type=int, default=3, help='repeat count, best time is shown'
+    )
+    opt.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='jobs to pass to upgrade, default is pipxu default',
+    )
+    opt.add_argument('-o', '--output', help='also append results to this file')
+    args = opt.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    lines = []
+    allres = {}
+    for size in sizes:
+        print(f'Benchmarking {size} apps ..', file=sys.stderr)
+        allres[size] = bench(size, args.repeat, args.jobs)
+
+    names = list(allres[sizes[0]])
+    width = max(len(n) for n in names)
+    lines.append(f'{"apps":{width}}' + ''.join(f'{s:>10}' for s in sizes))
+    for name in names:
+        lines.append(
+            f'{name:{width}}' + ''.join(f'{allres[s][name]:10.3f}' for s in sizes)
+        )
+
+    out = '\n'.join(lines)
+    print(out)
+    if args.output:
+        with open(args.output, 'a') as fp:
+            fp.write(out + '\n\n')
+
+    return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
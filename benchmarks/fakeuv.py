@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Author: Mark Blakeney, Feb 2024.
+"""
+Stub uv executable for benchmarking pipxu without a network.
+
+Implements just enough of "uv venv" and "uv pip install/uninstall/list/
+freeze" for pipxu to run. Every requested package is synthesized on the
+fly as a fixture with dist-info, RECORD, an executable script, and a man
+page. Each application package also pulls in one dependency package,
+unless --no-deps is given.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import shutil
+import sys
+from pathlib import Path
+
+VERSION = 'uv 0.9.0 (fakeuv)'
+PKG_VERSION = '1.0'
+DEP_SUFFIX = '-dep'
+
+PYVER = f'python{sys.version_info.major}.{sys.version_info.minor}'
+
+# Options which take a value, so we can skip over them
+VALUE_OPTS = {'-p', '--python', '-i', '--index-url', '-r', '--requirement', '--format'}
+
+
+def site_packages(vdir: Path) -> Path:
+    "Return the site-packages dir of the venv"
+    return vdir / 'lib' / PYVER / 'site-packages'
+
+
+def dist_name(name: str) -> str:
+    "Return the dist-info dir name component for the package name"
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def make_venv(vdir: Path) -> None:
+    "Create a minimal venv"
+    bindir = vdir / 'bin'
+    bindir.mkdir(parents=True, exist_ok=True)
+    site_packages(vdir).mkdir(parents=True, exist_ok=True)
+    python = bindir / 'python'
+    if not python.is_symlink():
+        python.symlink_to(sys.executable)
+
+    (vdir / 'pyvenv.cfg').write_text(
+        f'home = {Path(sys.executable).parent}\nversion_info = {sys.version.split()[0]}\n'
+    )
+
+
+def write_package(vdir: Path, name: str, version: str, *, app: bool) -> None:
+    "Write a synthetic installed package fixture into the venv"
+    sdir = site_packages(vdir)
+    ddir = sdir / f'{dist_name(name)}-{version}.dist-info'
+    if ddir.exists():
+        return
+
+    ddir.mkdir(parents=True)
+    (ddir / 'METADATA').write_text(
+        f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\n'
+    )
+    (ddir / 'INSTALLER').write_text('uv\n')
+    record = [f'{ddir.name}/METADATA,,', f'{ddir.name}/INSTALLER,,']
+
+    if app:
+        script = vdir / 'bin' / name
+        script.write_text(f'#!{vdir}/bin/python\nprint("{name}")\n')
+        script.chmod(0o755)
+        record.append(f'../../../bin/{name},,')
+
+        mandir = vdir / 'share' / 'man' / 'man1'
+        mandir.mkdir(parents=True, exist_ok=True)
+        (mandir / f'{name}.1').write_text(f'.TH {name} 1\n')
+        record.append(f'../../../share/man/man1/{name}.1,,')
+
+    record.append(f'{ddir.name}/RECORD,,')
+    (ddir / 'RECORD').write_text('\n'.join(record) + '\n')
+
+
+def get_packages(vdir: Path) -> dict[str, tuple[str, Path]]:
+    "Return dict of installed package name -> (version, dist-info dir)"
+    pkgs = {}
+    for ddir in site_packages(vdir).glob('*.dist-info'):
+        meta = dict(
+            line.split(': ', 1)
+            for line in (ddir / 'METADATA').read_text().splitlines()
+            if ': ' in line
+        )
+        pkgs[meta['Name']] = (meta['Version'], ddir)
+
+    return pkgs
+
+
+def remove_package(ddir: Path) -> None:
+    "Remove an installed package and all the files in its RECORD"
+    for line in (ddir / 'RECORD').read_text().splitlines():
+        path = ddir.parent / line.split(',', 1)[0]
+        if path.is_file():
+            path.unlink()
+
+    shutil.rmtree(ddir, ignore_errors=True)
+
+
+def parse(args: list[str]) -> tuple[dict[str, str], list[str]]:
+    "Parse args into a dict of options and a list of positional args"
+    opts = {}
+    posargs = []
+    it = iter(args)
+    for arg in it:
+        if arg in VALUE_OPTS:
+            opts[arg] = next(it)
+        elif arg.startswith('-'):
+            opts[arg] = ''
+        else:
+            posargs.append(arg)
+
+    return opts, posargs
+
+
+def pip(cmd: str, args: list[str]) -> int:
+    "Run a fake pip command"
+    opts, pkgs = parse(args)
+    vdir = Path(opts.get('-p') or opts.get('--python') or '.')
+
+    if cmd == 'install':
+        if reqfile := (opts.get('-r') or opts.get('--requirement')):
+            pkgs += Path(reqfile).read_text().split()
+
+        for pkg in pkgs:
+            name, _, version = pkg.partition('==')
+            name = re.sub(r'\[.*\]', '', name)
+            app = not name.endswith(DEP_SUFFIX)
+            write_package(vdir, name, version or PKG_VERSION, app=app)
+            if app and not reqfile and '--no-deps' not in opts:
+                write_package(vdir, name + DEP_SUFFIX, PKG_VERSION, app=False)
+    elif cmd == 'uninstall':
+        installed = get_packages(vdir)
+        for pkg in pkgs:
+            if pkg in installed:
+                remove_package(installed[pkg][1])
+    elif cmd == 'freeze':
+        for name, (version, _) in sorted(get_packages(vdir).items()):
+            print(f'{name}=={version}')
+    elif cmd == 'list':
+        pkgs_list = sorted(get_packages(vdir).items())
+        if opts.get('--format') == 'json':
+            print(json.dumps([{'name': n, 'version': v} for n, (v, _) in pkgs_list]))
+        else:
+            for name, (version, _) in pkgs_list:
+                print(f'{name} {version}')
+    else:
+        print(f'fakeuv: unsupported pip command "{cmd}"', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def main() -> int:
+    "Main code"
+    args = sys.argv[1:]
+    if not args:
+        return 2
+
+    if args[0] == '--version':
+        print(VERSION)
+        return 0
+
+    if args[0] == 'venv':
+        _, posargs = parse(args[1:])
+        make_venv(Path(posargs[0] if posargs else '.venv'))
+        return 0
+
+    if args[0] == 'pip' and len(args) > 1:
+        return pip(args[1], args[2:])
+
+    print(f'fakeuv: unsupported command {args}', file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
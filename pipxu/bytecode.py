@@ -0,0 +1,216 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Deferred bytecode compilation of application venvs.
+
+When compilation is deferred, venvs are installed without compiling
+bytecode and are instead queued in PIPXU_HOME/compile_queue/. They are
+compiled later by the compile command, which only compiles files whose
+bytecode is missing or stale. The files to compile across all venvs are
+split into batches which are run in parallel, each batch by a separate
+compileall process using the venv's own python.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import tempfile
+from argparse import Namespace
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import utils
+from .run import run
+
+QUEUE_DIR = 'compile_queue'
+
+# Minimum number of files to compile per process
+MIN_BATCH = 200
+
+
+def _queue_dir(args: Namespace) -> Path:
+    "Return the directory of queued venvs"
+    return args._home_dir / QUEUE_DIR
+
+
+def queue(args: Namespace, vdir: Path) -> None:
+    "Queue the given venv for later compilation"
+    qdir = _queue_dir(args)
+    qdir.mkdir(exist_ok=True)
+    (qdir / vdir.name).touch()
+
+
+def unqueue(args: Namespace, vdir: Path) -> None:
+    "Remove the given venv from the queue"
+    (_queue_dir(args) / vdir.name).unlink(missing_ok=True)
+
+
+def get_queued(args: Namespace) -> list[Path]:
+    "Return the queued venvs, removing any which no longer exist"
+    qdir = _queue_dir(args)
+    if not qdir.is_dir():
+        return []
+
+    vdirs = []
+    for file in qdir.iterdir():
+        vdir = args._venvs_dir / file.name
+        if vdir.is_dir():
+            vdirs.append(vdir)
+        else:
+            file.unlink(missing_ok=True)
+
+    return sorted(vdirs, key=lambda v: int(v.name) if v.name.isdigit() else 0)
+
+
+def _is_current(src: Path, pyc: Path) -> bool:
+    "Return True if the pyc file is current for its source"
+    try:
+        with pyc.open('rb') as fp:
+            header = fp.read(16)
+        stat = src.stat()
+    except OSError:
+        return False
+
+    if len(header) != 16:
+        return False
+
+    flags = int.from_bytes(header[4:8], 'little')
+    if flags == 0:
+        # Timestamp based pyc, as we compile
+        return (
+            int.from_bytes(header[8:12], 'little') == int(stat.st_mtime) & 0xFFFFFFFF
+            and int.from_bytes(header[12:16], 'little') == stat.st_size & 0xFFFFFFFF
+        )
+
+    # Hash based pyc, e.g. as compileall writes when SOURCE_DATE_EPOCH is
+    # set. Python never checks an unchecked one. We can only check the
+    # hash of a checked one when it was compiled by our python version.
+    if flags == 0b01:
+        return True
+
+    from importlib.util import MAGIC_NUMBER, source_hash
+
+    if flags != 0b11 or header[:4] != MAGIC_NUMBER:
+        return False
+
+    try:
+        return source_hash(src.read_bytes()) == header[8:16]
+    except OSError:
+        return False
+
+
+def _python_version(sdir: Path) -> tuple[int, ...]:
+    "Return the venv python version from its site-packages dir"
+    return tuple(int(x) for x in re.findall(r'\d+', sdir.parent.name))
+
+
+def _pyc(src: Path, sdir: Path, optimize: int) -> Path:
+    "Return the pyc file for the source file, for the venv python"
+    # Bytecode tag for the venv python, e.g. python3.12 -> cpython-312,
+    # or pypy3.10 -> pypy310
+    name = sdir.parent.name
+    if name.startswith('pypy'):
+        tag = name.replace('.', '')
+    else:
+        tag = 'cpython-' + name[len('python') :].replace('.', '')
+    if optimize:
+        tag += f'.opt-{optimize}'
+
+    return src.parent / '__pycache__' / f'{src.name[:-3]}.{tag}.pyc'
+
+
+def stale_files(vdir: Path, optimize: int) -> list[str]:
+    "Return the source files in the venv which need to be compiled"
+    files = []
+    for sdir in utils.site_packages(vdir):
+        for root, dirs, names in os.walk(sdir):
+            dirs[:] = [d for d in dirs if d != '__pycache__']
+            for name in names:
+                if name.endswith('.py'):
+                    src = Path(root, name)
+                    if not _is_current(src, _pyc(src, sdir, optimize)):
+                        files.append(str(src))
+
+    return files
+
+
+def _batches(
+    vfiles: dict[Path, list[str]], jobs: int
+) -> Iterable[tuple[Path, list[str]]]:
+    "Split the files of all venvs into batches to spread over the jobs"
+    total = sum(len(f) for f in vfiles.values())
+    size = max(MIN_BATCH, math.ceil(total / jobs))
+    for vdir, files in vfiles.items():
+        for i in range(0, len(files), size):
+            yield vdir, files[i : i + size]
+
+
+def _compile_args(sdir: Path, optimize: int) -> list[str]:
+    "Return the python args to run compileall at the given optimization level"
+    # Always write timestamp based pycs, which we can check are current,
+    # even if SOURCE_DATE_EPOCH is set
+    compileall = ['-m', 'compileall', '--invalidation-mode', 'timestamp']
+
+    # The compileall -o option was only added in python 3.9, but the
+    # python -O option has the same effect
+    if not optimize or _python_version(sdir) >= (3, 9):
+        return [*compileall, *utils.make_args((optimize, '-o', str(optimize)))]
+
+    return ['-' + 'O' * optimize, *compileall]
+
+
+def compile_venvs(
+    args: Namespace, vdirs: list[Path], jobs: int, optimize: int
+) -> tuple[int, int, list[Path]]:
+    """
+    Compile stale files in the given venvs, return number of (files,
+    venvs) compiled, and the venvs which failed to compile.
+    """
+    vfiles = {}
+    for vdir in vdirs:
+        if files := stale_files(vdir, optimize):
+            vfiles[vdir] = files
+        else:
+            unqueue(args, vdir)
+
+    if not vfiles:
+        return 0, 0, []
+
+    # Largest batches first so the pool finishes as evenly as possible
+    batches = sorted(_batches(vfiles, jobs), key=lambda b: len(b[1]), reverse=True)
+
+    with tempfile.TemporaryDirectory() as tdir:
+
+        def compile_batch(num: int) -> Path | None:
+            "Compile the batch, return its venv if it failed"
+            vdir, files = batches[num]
+            flist = Path(tdir, f'{num}.txt')
+            flist.write_text('\n'.join(files) + '\n')
+            python = str(utils.vdir_bin(vdir) / 'python')
+            sdir = utils.site_packages(vdir)[0]
+            cmd = [python, *_compile_args(sdir, optimize), '-qq', '-i', str(flist)]
+            if run(cmd, quiet=not args.verbose, ignore_error=True):
+                return None
+
+            # Errors, e.g. for template files with invalid syntax, are
+            # ignored the same as uv does when it compiles. But it has
+            # failed if nothing at all was compiled.
+            for file in files:
+                src = Path(file)
+                if _is_current(src, _pyc(src, sdir, optimize)):
+                    return None
+
+            return vdir
+
+        with ThreadPoolExecutor(max_workers=jobs) as ex:
+            failed = {v for v in ex.map(compile_batch, range(len(batches))) if v}
+
+    # Leave failed venvs queued so they are tried again next time
+    for vdir in vfiles:
+        if vdir not in failed:
+            unqueue(args, vdir)
+
+    nfiles = sum(len(f) for v, f in vfiles.items() if v not in failed)
+    return nfiles, len(vfiles) - len(failed), sorted(failed)
@@ -0,0 +1,48 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Static registry of all commands.
+
+Each command is implemented in a module of the same name in this package
+which is only imported when that command is run. Each entry gives the
+command's aliases and the one line help shown in the main usage, which
+should match the first paragraph of the module's docstring.
+"""
+
+from __future__ import annotations
+
+COMMANDS: dict[str, tuple[list[str], str]] = {
+    'bundle': (
+        [],
+        'Collect wheels for applications into a local wheelhouse directory.',
+    ),
+    'compile': ([], 'Compile bytecode for application venvs.'),
+    'debug': (['d'], 'Run an installed application using a debugger.'),
+    'dedupe': ([], 'Deduplicate identical files across application venvs.'),
+    'export': ([], 'Export a manifest of installed applications.'),
+    'gc': (
+        [],
+        'Purge stray virtual environments, package links, and executable links.',
+    ),
+    'inject': (['ij'], 'Install extra packages into an application.'),
+    'install': (
+        ['i'],
+        'Install one or more Python applications using isolated virtual environments.',
+    ),
+    'list': (['l'], 'List applications installed by this tool.'),
+    'outdated': ([], 'List applications which have newer versions available.'),
+    'reinstall': (['re'], 'Reinstall one, or more, or all applications.'),
+    'rollback': ([], 'Roll back an application to a previous venv generation.'),
+    'runpip': (
+        [],
+        (
+            'Run pip with given arguments on virtual environment for the given '
+            'application.'
+        ),
+    ),
+    'sync': ([], 'Sync installed applications to a manifest.'),
+    'uninject': (['uj'], 'Uninstall extra packages from an application.'),
+    'uninstall': (['remove', 'rm'], 'Uninstall one, or more, or all applications.'),
+    'upgrade': (['update', 'up'], 'Upgrade one, or more, or all applications.'),
+    'venv': ([], 'List application virtual environment paths.'),
+    'version': ([], 'List installed application versions.'),
+}
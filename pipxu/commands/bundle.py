@@ -0,0 +1,137 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Collect wheels for applications into a local wheelhouse directory.
+
+Wheels for every package in each application's venv (including injected
+packages) are downloaded, or built locally if no wheel is available,
+into the given directory. Wheels already in the directory are not
+fetched again, so the same wheel shared by many applications is only
+stored once. Editable packages can not be bundled. The directory can
+then be copied to machines without network access and used with the
+--from-bundle option of the install and reinstall commands.
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from .. import utils
+from ..run import run
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument('--all', action='store_true', help='bundle ALL applications')
+    parser.add_argument(
+        '--skip',
+        action='store_true',
+        help='skip the specified applications when '
+        'bundling all (only can be specified with --all)',
+    )
+    parser.add_argument('dir', help='wheelhouse directory to write wheels to')
+    parser.add_argument(
+        'package',
+        nargs='*',
+        help='application[s] to bundle (or to skip for --all --skip)',
+    )
+
+
+def _compatible(wheel: str, pyver: tuple[int, int]) -> bool:
+    "Return True if wheel name is for the given python version"
+    major, minor = pyver
+    for tag in wheel[:-4].split('-')[-3].split('.'):
+        if tag in ('py3', f'py{major}{minor}', f'cp{major}{minor}'):
+            return True
+        # Stable ABI wheels work on any later version
+        if (
+            tag.startswith(f'cp{major}')
+            and '-abi3-' in wheel
+            and int(tag[3:] or 0) <= minor
+        ):
+            return True
+
+    return False
+
+
+def _get_wheels(wdir: Path) -> dict[tuple[str, str], list[str]]:
+    "Return the wheels in the directory, keyed by (name, version)"
+    wheels: dict[tuple[str, str], list[str]] = {}
+    for whl in wdir.glob('*.whl'):
+        parts = whl.name.split('-')
+        if len(parts) >= 5:
+            key = (utils.normalize_name(parts[0]), parts[1])
+            wheels.setdefault(key, []).append(whl.name)
+
+    return wheels
+
+
+def _bundle(args: Namespace, pkgname: str, wdir: Path) -> str | None:
+    "Bundle the wheels for the given application"
+    pkgname, vdir = utils.get_package_from_arg(pkgname, args)
+    if not vdir:
+        return f'Application {pkgname} is not installed.'
+
+    if not (sdirs := utils.site_packages(vdir)):
+        return f'Error: can not determine python version of {pkgname}.'
+
+    pyname = sdirs[0].parent.name
+    major, minor = (int(v) for v in pyname[len('python') :].split('.')[:2])
+
+    # Only fetch wheels which we do not already have
+    wheels = _get_wheels(wdir)
+    reqs = []
+    for line in (vdir / args._freeze_file).read_text().splitlines():
+        if line.startswith('-e '):
+            print(f'Skipping editable {line[3:]} in {pkgname}.', file=sys.stderr)
+            continue
+
+        name, _, version = line.partition('==')
+        have = wheels.get((utils.normalize_name(name), version), [])
+        if not any(_compatible(w, (major, minor)) for w in have):
+            reqs.append(line)
+
+    if not reqs:
+        print(f'{pkgname} is already bundled.')
+        return None
+
+    print(f'Bundling {len(reqs)} packages for {pkgname} ..')
+    data = utils.get_json(vdir, args) or {}
+    url = data.get('url')
+
+    # Run pip with the same python version as the application so we get
+    # compatible wheels
+    python = str(utils.vdir_bin(vdir) / 'python')
+    with tempfile.TemporaryDirectory() as tdir:
+        reqfile = Path(tdir, 'requirements.txt')
+        reqfile.write_text('\n'.join(reqs) + '\n')
+        cmd = [args._uv, 'tool', 'run', '-p', python, 'pip', 'wheel']
+        cmd += ['--no-deps', '--disable-pip-version-check']
+        cmd += utils.make_args(
+            (not args.verbose, '-q'),
+            (url, '-i', url),
+            (True, '--find-links', str(wdir)),
+            (True, '-w', str(wdir)),
+            (True, '-r', str(reqfile)),
+        )
+        if not run(cmd):
+            return f'Error: failed to bundle {pkgname}.'
+
+    print(f'{pkgname} bundled.')
+    return None
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    wdir = utils.subenvars(args.dir, resolve=True)
+    wdir.mkdir(parents=True, exist_ok=True)
+
+    # Run sequentially since applications will commonly share wheels
+    for pkgname in utils.get_package_names(args):
+        if error := _bundle(args, pkgname, wdir):
+            return error
+
+    return None
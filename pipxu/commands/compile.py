@@ -0,0 +1,75 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Compile bytecode for application venvs.
+
+By default, compiles the venvs queued by commands run with the global
+--defer-compile option (or PIPXU_DEFER_COMPILE set). Only files with
+missing or stale bytecode are compiled, using a pool of parallel
+processes spanning all the venvs.
+"""
+
+from __future__ import annotations
+
+import os
+from argparse import ArgumentParser, Namespace
+
+from .. import bytecode, registry, utils
+
+uses_uv = False
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='compile ALL applications, not just those queued',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of parallel compile processes, default is number of CPUs',
+    )
+    parser.add_argument(
+        '--optimize',
+        type=int,
+        choices=(0, 1, 2),
+        default=0,
+        help='optimization level of bytecode, default=%(default)d',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument(
+        'package', nargs='*', help='compile the given application[s] instead'
+    )
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    if args.all or args.package:
+        pkgs = registry.load(args)
+        names = (
+            sorted(pkgs)
+            if args.all
+            else [utils.get_package_name(p, args) for p in args.package]
+        )
+        vdirs = []
+        for pkgname in names:
+            if not (entry := pkgs.get(pkgname)):
+                return f'Application {pkgname} is not installed.'
+            vdirs.append(args._venvs_dir / str(entry['venv']))
+    else:
+        vdirs = bytecode.get_queued(args)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    nfiles, nvenvs, failed = bytecode.compile_venvs(args, vdirs, jobs, args.optimize)
+    if nfiles:
+        s = 's' if nvenvs > 1 else ''
+        print(f'Compiled {nfiles} files in {nvenvs} venv{s}.')
+    elif not failed:
+        print('Nothing to compile.')
+
+    if failed:
+        return f'Error: failed to compile {", ".join(str(v) for v in failed)}.'
+
+    return None
@@ -16,7 +16,7 @@ from argparse import ArgumentParser, Namespace
 from .. import utils
 from ..run import run
 
-aliases = ['d']
+uses_uv = False
 
 
 def init(parser: ArgumentParser) -> None:
@@ -0,0 +1,63 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Deduplicate identical files across application venvs.
+
+Identical files in different venvs (e.g. the same version of a common
+dependency used by many applications) are replaced by hard links to a
+single copy, or by reflinks if --reflink is given and the filesystem
+supports them. An index of file hashes is kept so later runs only hash
+new or changed files. The install and upgrade commands can also
+deduplicate just the venvs they change, using their --dedupe option.
+"""
+
+from __future__ import annotations
+
+from argparse import ArgumentParser, Namespace
+
+from .. import filestore, registry, utils
+
+uses_uv = False
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument(
+        '--reflink',
+        action='store_true',
+        help='use reflinks (copy on write clones) instead of hard links',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of files to hash in parallel, default is number of CPUs',
+    )
+    parser.add_argument(
+        'package',
+        nargs='*',
+        help='deduplicate the given application[s] only, against all others',
+    )
+
+
+def report(stats: filestore.Stats) -> str | None:
+    "Print the results of a dedupe, return any error"
+    mb = stats.saved / (1024 * 1024)
+    print(
+        f'Checked {stats.files} files, hashed {stats.hashed}, '
+        f'linked {stats.linked} saving {mb:.1f} MB.'
+    )
+    return stats.error
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    vdirs = None
+    if args.package:
+        pkgs = registry.load(args)
+        vdirs = []
+        for pkgname in (utils.get_package_name(p, args) for p in args.package):
+            if not (entry := pkgs.get(pkgname)):
+                return f'Application {pkgname} is not installed.'
+            vdirs.append(args._venvs_dir / str(entry['venv']))
+
+    return report(filestore.dedupe(args, vdirs, reflink=args.reflink, jobs=args.jobs))
@@ -0,0 +1,66 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Export a manifest of installed applications.
+
+The manifest is JSON giving each application's installed version,
+injected packages, and install options, i.e. index url, python, and
+the deps and system site packages flags. Editable applications are
+recorded by their path instead of a version. The manifest can be
+applied to this or another machine using the sync command.
+"""
+
+from __future__ import annotations
+
+import json
+from argparse import ArgumentParser, Namespace
+
+from .. import registry, utils
+
+uses_uv = False
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument(
+        '-o', '--output', help='write manifest to given file, default is stdout'
+    )
+    parser.add_argument(
+        'package', nargs='*', help='export the given application[s] only'
+    )
+
+
+def get_manifest(args: Namespace, pkgs: dict[str, dict]) -> dict[str, dict]:
+    "Return the manifest entries for the given registry packages"
+    apps = {}
+    for pkgname, entry in pkgs.items():
+        app = dict(entry['data'])
+        app.pop('name', None)
+        app.pop('apps', None)
+        if 'editpath' not in app:
+            vdir = args._venvs_dir / str(entry['venv'])
+            if vers := utils.installed_version(vdir, pkgname, args):
+                app['version'] = vers
+
+        apps[pkgname] = dict(sorted(app.items()))
+
+    return apps
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    pkgs = registry.load(args)
+    if args.package:
+        names = [utils.get_package_name(p, args) for p in args.package]
+        for pkgname in names:
+            if pkgname not in pkgs:
+                return f'Application {pkgname} is not installed.'
+        pkgs = {n: pkgs[n] for n in sorted(names)}
+
+    out = json.dumps({'apps': get_manifest(args, pkgs)}, indent=2) + '\n'
+
+    if args.output:
+        utils.subenvars(args.output).write_text(out)
+    else:
+        print(out, end='')
+
+    return None
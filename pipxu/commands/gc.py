@@ -0,0 +1,25 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Purge stray virtual environments, package links, and executable links.
+
+Venvs left behind by interrupted commands are always cleaned up
+automatically on the next run, and this full purge is also run
+automatically once a day. Use this command to force it now. This
+command also deletes everything in the trash before it returns, rather
+than leaving that to a background process.
+"""
+
+from __future__ import annotations
+
+from argparse import Namespace
+
+from .. import trash, utils
+
+uses_uv = False
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    utils.purge_old_files(args)
+    trash.empty(args._home_dir)
+    return None
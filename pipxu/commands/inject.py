@@ -9,9 +9,7 @@ from __future__ import annotations
 
 from argparse import ArgumentParser, Namespace
 
-from .. import utils
-
-aliases = ['ij']
+from .. import generations, utils
 
 
 def init(parser: ArgumentParser) -> None:
@@ -32,13 +30,20 @@ def main(args: Namespace) -> str | None:
     data = utils.get_json(vdir, args) or {}
     url = data.get('url')
     pip_args = (
-        'install --compile-bytecode -U'.split()
+        ['install', '-U']
+        + utils.compile_args(args)
         + utils.make_args((args.verbose, '-v'), (url, ('-i', url)))
         + args.extras
     )
-    if not utils.piprun(vdir, args, pip_args):
-        return f'Error: failed to install "{args.extras}" to {pkgname}'
+    with generations.stage(args, pkgname, vdir) as wvdir:
+        if not utils.piprun(wvdir, args, pip_args):
+            return f'Error: failed to install "{args.extras}" to {pkgname}'
 
-    return utils.add_or_remove_pkg(
-        vdir, args, pkgname, args.extras, data=data, add=True
-    )
+        if err := utils.add_or_remove_pkg(
+            wvdir, args, pkgname, args.extras, data=data, add=True
+        ):
+            return err
+
+        generations.switch(args, pkgname, wvdir)
+
+    return None
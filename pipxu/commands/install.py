@@ -6,25 +6,9 @@ from __future__ import annotations
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
-from filelock import FileLock
-
-from .. import utils
+from .. import layers, trace, utils
 from ..run import run
 
-MAX_VDIRS = 1_000_000
-
-aliases = ['i']
-
-
-def _get_next_vdir(vdirbase: Path) -> Path | None:
-    "Return the first available venv directory"
-    vdirs = set(int(f.name) for f in vdirbase.iterdir())
-    for n in range(1, MAX_VDIRS + 1):
-        if n not in vdirs:
-            return vdirbase / str(n)
-
-    return None
-
 
 def init(parser: ArgumentParser) -> None:
     "Called to add command arguments to parser at init"
@@ -52,59 +36,76 @@ def init(parser: ArgumentParser) -> None:
         help='allow venv access to system packages',
     )
     parser.add_argument('-i', '--index-url', help='base URL of Python Package Index')
-    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
-    parser.add_argument('package', nargs='+', help='application[s] to install')
-
-
-def main(args: Namespace) -> str | None:
-    "Called to action this command"
-    pyexe = str(utils.get_python(args))
-    venv_args = [args._uv, 'venv', '-p', pyexe] + utils.make_args(
-        (args.verbose, '-v'),
-        (not args.verbose, '-q'),
-        (args.system_site_packages, '--system-site-packages'),
+    parser.add_argument(
+        '-L',
+        '--layer',
+        action='append',
+        metavar='REQ',
+        help='install REQ and its dependencies in a shared layer venv, '
+        'used by all applications which resolve to the same set. '
+        'Can be specified multiple times',
     )
-
-    pip_args = 'install --compile-bytecode'.split() + utils.make_args(
-        (args.verbose, '-v'),
-        (args.index_url, '-i', args.index_url),
-        (args.force and args.editable, '--refresh'),
+    parser.add_argument(
+        '-B',
+        '--from-bundle',
+        metavar='DIR',
+        help='install offline, only from wheels in given bundle directory',
     )
-    pip_earg = utils.make_args((args.editable, '-e'))
-
-    vdirbase = args._venvs_dir
-    for pkg in args.package:
-        # Use a lock file in case we are running multiple installs in parallel
-        with FileLock(args._lockfile):
-            vdir = _get_next_vdir(vdirbase)
-            if not vdir:
-                return f'Error: Too many vdirs (>{MAX_VDIRS}) in {vdirbase}'
-
-            # Create the vdir
-            if not run(venv_args + [str(vdir)]):
-                utils.rm_vdir(vdir, args)
-                return f'Error: failed to create {vdir} for {pkg}.'
+    parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='deduplicate files of the installed venv[s] against all other venvs',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of applications to install in parallel, default is number of CPUs',
+    )
+    parser.add_argument('package', nargs='+', help='application[s] to install')
 
-        python_exe = str((utils.vdir_bin(vdir) / 'python').resolve())
-        python_ver = run((python_exe, '-V'), capture=True, ignore_error=True)
-        python_ver = python_ver.strip().split()[1] if python_ver else '?ver?'
-        print(f'Created "{vdir}" using "{python_exe}" ({python_ver})')
 
-        # Install the package
+def _install_vdir(
+    args: Namespace,
+    vdir: Path,
+    pkg: str,
+    venv_args: list[str],
+    pip_args: list[str],
+    pip_earg: list[str],
+    injected: list[str],
+) -> str | None:
+    "Install given package into the given new vdir"
+    # Create the vdir
+    if not run(venv_args + [str(vdir)]):
+        utils.rm_vdir(vdir, args)
+        return f'Error: failed to create {vdir} for {pkg}.'
+
+    python_exe = str((utils.vdir_bin(vdir) / 'python').resolve())
+    python_ver = run((python_exe, '-V'), capture=True, ignore_error=True)
+    python_ver = python_ver.strip().split()[1] if python_ver else '?ver?'
+    print(f'Created "{vdir}" using "{python_exe}" ({python_ver})')
+
+    # Install the package
+    with trace.context(phase='preinstall'):
         if not utils.piprun(vdir, args, pip_args + ['--no-deps'] + pip_earg + [pkg]):
             utils.rm_vdir(vdir, args)
             return f'Error: failed to preinstall "{pkg}".'
 
-        if not (versions := utils.get_versions(vdir, args)):
-            utils.rm_vdir(vdir, args)
-            return f'Error: failed to get versions for {pkg}.'
+    if not (versions := utils.get_versions(vdir)):
+        utils.rm_vdir(vdir, args)
+        return f'Error: failed to get versions for {pkg}.'
 
-        if len(versions) != 1:
-            return f'Error: multiple packages qualified: {list(versions)}'
+    if len(versions) != 1:
+        utils.rm_vdir(vdir, args)
+        return f'Error: multiple packages qualified: {list(versions)}'
 
-        pkgname, (vers, editpath) = versions.popitem()
-        pdir = Path(args._packages_dir, pkgname)
+    pkgname, (_, editpath) = versions.popitem()
+    pdir = Path(args._packages_dir, pkgname)
 
+    # Lock this package name so concurrent installs of the same package
+    # can not both claim it
+    with utils.pkg_lock(pkgname, args):
         if pdir.exists():
             if not args.force:
                 utils.rm_vdir(vdir, args)
@@ -113,7 +114,14 @@ def main(args: Namespace) -> str | None:
             utils.rm_vdir(pdir, args)
             pdir.unlink()
 
-        if not utils.piprun(vdir, args, pip_args + pip_earg + [pkg]):
+        if args.layer:
+            index_args = utils.make_args((args.index_url, '-i', args.index_url))
+            index_args += utils.bundle_args(args.from_bundle)
+            reqs = [' '.join(pip_earg + [pkg])] + injected
+            if err := layers.install(args, vdir, reqs, args.layer, index_args):
+                utils.rm_vdir(vdir, args)
+                return err
+        elif not utils.piprun(vdir, args, pip_args + pip_earg + [pkg] + injected):
             utils.rm_vdir(vdir, args)
             return f'Error: failed to install "{pkg}".'
 
@@ -123,6 +131,12 @@ def main(args: Namespace) -> str | None:
         if editpath:
             data['editpath'] = utils.unexpanduser(editpath)
 
+        if injected:
+            data['injected'] = sorted(injected)
+
+        if args.layer:
+            data['layer'] = args.layer
+
         if args.include_deps:
             data['deps'] = True
 
@@ -141,3 +155,54 @@ def main(args: Namespace) -> str | None:
             return err
 
     return None
+
+
+def install(
+    args: Namespace,
+    pkg: str,
+    cmd_args: tuple[list[str], list[str], list[str]],
+    injected: list[str] | None = None,
+) -> str | None:
+    "Install given package, with any given extra packages injected"
+    with utils.new_vdir(args) as vdir:
+        return _install_vdir(args, vdir, pkg, *cmd_args, injected or [])
+
+
+def make_cmd_args(args: Namespace) -> tuple[list[str], list[str], list[str]]:
+    "Return the uv venv, pip install, and pip editable args for an install"
+    pyexe = str(utils.get_python(args))
+    venv_args = [args._uv, 'venv', '-p', pyexe] + utils.make_args(
+        (args.verbose, '-v'),
+        (not args.verbose, '-q'),
+        (args.system_site_packages, '--system-site-packages'),
+    )
+
+    pip_args = (
+        ['install']
+        + utils.compile_args(args)
+        + utils.make_args(
+            (args.verbose, '-v'),
+            (args.index_url, '-i', args.index_url),
+            (args.force and args.editable, '--refresh'),
+        )
+    )
+    pip_args += utils.bundle_args(args.from_bundle)
+    pip_earg = utils.make_args((args.editable, '-e'))
+    return venv_args, pip_args, pip_earg
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    cmd_args = make_cmd_args(args)
+    if args.dedupe:
+        args._changed_vdirs = []
+
+    err = utils.run_jobs(lambda p: install(args, p, cmd_args), args.package, args.jobs)
+
+    if args.dedupe and args._changed_vdirs:
+        from .. import filestore
+        from .dedupe import report
+
+        err = report(filestore.dedupe(args, args._changed_vdirs)) or err
+
+    return err
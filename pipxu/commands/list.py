@@ -6,9 +6,9 @@ from __future__ import annotations
 import json
 from argparse import ArgumentParser, Namespace
 
-from .. import utils
+from .. import registry, utils
 
-aliases = ['l']
+uses_uv = False
 
 
 def _show(value: str) -> str:
@@ -30,25 +30,26 @@ def init(parser: ArgumentParser) -> None:
 
 def main(args: Namespace) -> str | None:
     "Called to action this command"
+    pkgs = registry.load(args)
     if args.package:
-        pkgs = [utils.get_package_from_arg(p, args) for p in args.package]
+        names = [utils.get_package_name(p, args) for p in args.package]
     else:
-        pkgs = sorted((p.name, p) for p in args._packages_dir.iterdir())
+        names = sorted(pkgs)
 
     json_out = {}
-    for pkgname, vdir in pkgs:
-        if not vdir:
+    for pkgname in names:
+        if not (entry := pkgs.get(pkgname)):
             return f'Application {pkgname} is not installed.'
 
-        if data := utils.get_json(vdir, args):
-            data.pop('name', None)
-            if args.venv:
-                data['venv'] = int(vdir.resolve().name)
-            if args.json:
-                json_out[pkgname] = data
-            else:
-                d = ', '.join(f'{k}={_show(data[k])}' for k in sorted(data))
-                print(f'{pkgname}: {d}')
+        data = dict(entry['data'])
+        data.pop('name', None)
+        if args.venv:
+            data['venv'] = entry['venv']
+        if args.json:
+            json_out[pkgname] = data
+        else:
+            d = ', '.join(f'{k}={_show(data[k])}' for k in sorted(data))
+            print(f'{pkgname}: {d}')
 
     if args.json:
         print(json.dumps(json_out, indent=2))
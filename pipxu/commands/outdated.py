@@ -0,0 +1,195 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+List applications which have newer versions available.
+
+The package index of each application (i.e. as given with --index-url
+when it was installed, else the default index) is queried for all
+applications (and their injected packages) concurrently. Only versions
+which support the python of the application's venv are considered.
+Index responses are cached in PIPXU_HOME so repeated runs within the
+cache TTL make no network requests. Editable and URL installed
+applications and packages are not checked.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .. import index, registry, utils
+
+if TYPE_CHECKING:
+    from packaging.version import Version
+
+uses_uv = False
+
+DEFAULT_TTL = 600
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument('--json', action='store_true', help='output json instead')
+    parser.add_argument(
+        '--pre', action='store_true', help='include pre-release versions'
+    )
+    parser.add_argument(
+        '-i',
+        '--index-url',
+        help='base URL of Python Package Index to check instead of '
+        'the application index',
+    )
+    parser.add_argument(
+        '-t',
+        '--cache-ttl',
+        type=float,
+        default=DEFAULT_TTL,
+        help='seconds to use cached index responses without checking '
+        'the index, default=%(default)d',
+    )
+    parser.add_argument(
+        '-r',
+        '--refresh',
+        action='store_true',
+        help='revalidate all cached index responses',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of parallel index queries, default is 4 times number of CPUs',
+    )
+    parser.add_argument(
+        'package', nargs='*', help='check the given application[s] only'
+    )
+
+
+def _latest(versions: list[str], pre: bool) -> Version | None:
+    "Return the latest of the given versions"
+    from packaging.version import InvalidVersion, Version
+
+    latest = None
+    for ver in versions:
+        try:
+            v = Version(ver)
+        except InvalidVersion:
+            continue
+        if (pre or not v.is_prerelease) and (latest is None or v > latest):
+            latest = v
+
+    return latest
+
+
+def _python_version(vdir: Path) -> str | None:
+    "Return the full python version of the venv"
+    try:
+        lines = (vdir / 'pyvenv.cfg').read_text().splitlines()
+    except OSError:
+        return None
+
+    # uv records version_info, venv records version
+    for line in lines:
+        key, _, val = line.partition('=')
+        if key.strip() in ('version_info', 'version'):
+            return val.strip()
+
+    return None
+
+
+def _injected_names(data: dict) -> list[str]:
+    "Return the normalized names of the packages injected into the app"
+    from packaging.requirements import InvalidRequirement, Requirement
+
+    names = []
+    for req in data.get('injected', []):
+        try:
+            names.append(utils.normalize_name(Requirement(req).name))
+        except InvalidRequirement:
+            # Paths and URLs are not checked
+            pass
+
+    return names
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    from concurrent.futures import ThreadPoolExecutor
+    from http.client import HTTPException
+
+    from packaging.version import InvalidVersion, Version
+
+    pkgs = registry.load(args)
+    if args.package:
+        names = [utils.get_package_name(p, args) for p in args.package]
+        for pkgname in names:
+            if pkgname not in pkgs:
+                return f'Application {pkgname} is not installed.'
+    else:
+        names = sorted(pkgs)
+
+    # Work out the installed version, index, and python of each
+    # application and its injected packages, keyed by (app, package)
+    default_url = index.default_index()
+    checks = {}
+    for pkgname in names:
+        vdir = args._venvs_dir / str(pkgs[pkgname]['venv'])
+        data = pkgs[pkgname]['data']
+        url = args.index_url or data.get('url') or default_url
+        python = _python_version(vdir)
+        for name in [pkgname] + _injected_names(data):
+            if vers := utils.installed_version(vdir, name, args):
+                checks[pkgname, name] = (vers, url, python)
+
+    cache = index.Cache(args, args.cache_ttl, args.refresh)
+
+    def check(key: tuple[str, str]) -> list[str] | Exception:
+        _, url, python = checks[key]
+        # URLError and other network errors are all OSErrors
+        try:
+            return index.get_versions(cache, url, key[1], python)
+        except (OSError, ValueError, HTTPException) as e:
+            return e
+
+    jobs = args.jobs or 4 * (os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        results = dict(zip(checks, ex.map(check, checks)))
+
+    cache.evict()
+
+    errors = 0
+    outdated = []
+    for (pkgname, name), result in results.items():
+        vers, url, _ = checks[pkgname, name]
+        if isinstance(result, Exception):
+            print(f'Error: {name}: failed to query {url}: {result}', file=sys.stderr)
+            errors += 1
+            continue
+
+        try:
+            current = Version(vers)
+        except InvalidVersion:
+            continue
+
+        latest = _latest(result, args.pre or current.is_prerelease)
+        if latest and latest > current:
+            entry = {'name': name, 'version': vers, 'latest': str(latest)}
+            if name != pkgname:
+                entry['injected_into'] = pkgname
+            outdated.append(entry)
+
+    if args.json:
+        print(json.dumps(outdated, indent=2))
+    else:
+        for entry in outdated:
+            name = entry['name']
+            if app := entry.get('injected_into'):
+                name = f'{app} (injected {name})'
+            print(f'{name}: {entry["version"]} -> {entry["latest"]}')
+
+    if errors:
+        return f'Error: failed to check {errors} of {len(checks)} packages.'
+
+    return None
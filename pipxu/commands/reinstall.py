@@ -3,17 +3,12 @@
 
 from __future__ import annotations
 
-import shutil
-import tempfile
 from argparse import ArgumentParser, Namespace
 from copy import copy
-from pathlib import Path
 
-from .. import utils
+from .. import generations, layers, utils
 from ..run import run
 
-aliases = ['re']
-
 
 def _reinstall(args: Namespace, pkgname: str, venv_args: list[str]) -> str | None:
     "Reinstall given application"
@@ -22,13 +17,19 @@ def _reinstall(args: Namespace, pkgname: str, venv_args: list[str]) -> str | Non
         return f'Application {pkgname} is not installed.'
 
     print(f'Reinstalling {pkgname} ..')
-    pip_args = 'sync --compile-bytecode --reinstall'.split() + utils.make_args(
-        (args.verbose, '-v')
+    pip_args = (
+        ['sync', '--reinstall']
+        + utils.compile_args(args)
+        + utils.make_args((args.verbose, '-v'))
     )
 
     data = utils.get_json(vdir, args) or {}
-    if url := data.get('url'):
-        pip_args.extend(['-i', url])
+    if args.from_bundle:
+        index_args = utils.bundle_args(args.from_bundle)
+    elif url := data.get('url'):
+        index_args = ['-i', url]
+    else:
+        index_args = []
 
     # Use explicit python (or reset) if given, else use what was
     # explicitly specified in original install, else use default
@@ -59,22 +60,33 @@ def _reinstall(args: Namespace, pkgname: str, venv_args: list[str]) -> str | Non
     if editpath := data.get('editpath'):
         data['editpath'] = utils.unexpanduser(editpath)
 
-    with tempfile.TemporaryDirectory() as tdir:
-        tfile = Path(tdir, args._freeze_file)
-        shutil.copyfile(vdir / args._freeze_file, tfile)
-
-        # Recreate the vdir
-        if not run(venv_args + [str(vdir)]):
-            utils.rm_vdir(vdir, args)
-            return f'Error: failed to recreate {vdir} for {pkgname}.'
-
-        if not utils.piprun(vdir, args, pip_args + [str(tfile)]):
-            utils.rm_vdir(vdir, args)
+    # Build the replacement in a new venv so the application remains
+    # usable, and the old venv is kept intact if anything fails
+    with utils.new_vdir(args) as newvdir:
+        if not run(venv_args + [str(newvdir)]):
+            utils.rm_vdir(newvdir, args)
+            return f'Error: failed to create {newvdir} for {pkgname}.'
+
+        if data.get('layer'):
+            if err := layers.copy(args, vdir, newvdir, index_args):
+                utils.rm_vdir(newvdir, args)
+                return err
+        elif not utils.piprun(
+            newvdir, args, pip_args + index_args + [str(vdir / args._freeze_file)]
+        ):
+            utils.rm_vdir(newvdir, args)
             return f'Error: failed to resync {pkgname}'
 
-    if err := utils.make_links(vdir, pkgname, args, data):
-        return err
+        if err := utils.make_links(newvdir, pkgname, args, data):
+            # Restore any links we changed back to the old venv
+            utils.make_links(vdir, pkgname, args, None)
+            utils.rm_vdir(newvdir, args)
+            return err
 
+        # Atomically switch the package to the new venv
+        generations.switch(args, pkgname, newvdir)
+
+    generations.retire(args, pkgname, vdir)
     print(f'{pkgname} reinstalled.')
     return None
 
@@ -103,7 +115,20 @@ def init(parser: ArgumentParser) -> None:
         help='remove venv access to system packages, '
         'overrides the per-application setting',
     )
+    parser.add_argument(
+        '-B',
+        '--from-bundle',
+        metavar='DIR',
+        help='reinstall offline, only from wheels in given bundle directory',
+    )
     parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of applications to reinstall in parallel, '
+        'default is number of CPUs',
+    )
     parser.add_argument('--all', action='store_true', help='reinstall ALL applications')
     parser.add_argument(
         '--skip',
@@ -120,20 +145,12 @@ def init(parser: ArgumentParser) -> None:
 
 def main(args: Namespace) -> str | None:
     "Called to action this command"
-    import os
-
     venv_args = [args._uv, 'venv'] + utils.make_args(
         (args.verbose, '-v'), (not args.verbose, '-q')
     )
 
-    # Since uv version 0.8+ we need `--clear` option on `venv` command, or set
-    # this env variable. We use the env var to ensure compatibility with older
-    # uv versions.
-
-    os.environ['UV_VENV_CLEAR'] = '1'
-
-    for pkgname in utils.get_package_names(args):
-        if error := _reinstall(args, pkgname, venv_args.copy()):
-            return error
-
-    return None
+    return utils.run_jobs(
+        lambda p: _reinstall(args, p, venv_args.copy()),
+        utils.get_package_names(args),
+        args.jobs,
+    )
@@ -0,0 +1,82 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Roll back an application to a previous venv generation.
+
+Previous generations are only retained when the global
+--keep-generations option (or PIPXU_KEEP_GENERATIONS) is set when
+upgrading, reinstalling, injecting, or uninjecting. The current venv is
+in turn retained as the most recent generation, so running rollback
+again will undo the rollback.
+"""
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from .. import generations, utils
+
+uses_uv = False
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument(
+        '-l', '--list', action='store_true', help='just list available generations'
+    )
+    parser.add_argument(
+        '-n',
+        '--generation',
+        type=int,
+        default=1,
+        help='generation to roll back to, 1 is the most recent previous '
+        'generation, default=%(default)d',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument('package', help='installed application name')
+
+
+def _version(vdir: Path, pkgname: str) -> str:
+    "Return the version of the package in the given venv"
+    return utils.get_versions(vdir, pkgname).get(pkgname, ('unknown', None))[0]
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    pkgname, vdir = utils.get_package_from_arg(args.package, args)
+    if not vdir:
+        return f'Application {pkgname} is not installed.'
+
+    gens = generations.get(args, pkgname)
+
+    if args.list:
+        print(f'0: {pkgname}=={_version(vdir, pkgname)} (current)')
+        for num, link in enumerate(gens, 1):
+            when = time.strftime(
+                '%Y-%m-%d %H:%M:%S', time.localtime(link.lstat().st_mtime)
+            )
+            ver = _version(link.resolve(), pkgname)
+            print(f'{num}: {pkgname}=={ver} (replaced {when})')
+        return None
+
+    if not gens:
+        return f'Application {pkgname} has no previous generations.'
+
+    if not 1 <= args.generation <= len(gens):
+        return f'Generation must be between 1 and {len(gens)}.'
+
+    link = gens[args.generation - 1]
+    gvdir = link.resolve()
+    if not gvdir.is_dir():
+        return f'Error: generation venv "{gvdir}" does not exist.'
+
+    if err := utils.make_links(gvdir, pkgname, args, None):
+        utils.make_links(vdir, pkgname, args, None)
+        return err
+
+    generations.switch(args, pkgname, gvdir)
+    link.unlink()
+    generations.retire(args, pkgname, vdir, evict=False)
+    print(f'{pkgname} rolled back to {_version(gvdir, pkgname)}.')
+    return None
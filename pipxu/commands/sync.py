@@ -0,0 +1,231 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Sync installed applications to a manifest.
+
+The manifest is as written by the export command. Installed
+applications are compared against it and only the changes needed are
+made, i.e. missing applications are installed, applications with
+different versions or injected packages are updated in place,
+applications with different install options are reinstalled, and
+applications not in the manifest are uninstalled (unless --no-remove).
+Changes to different applications are made in parallel. The comparison
+only reads the registry and stored freeze lists so syncing an already
+synced machine is fast.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from copy import copy
+from pathlib import Path
+
+from .. import generations, registry, utils
+from . import install, uninstall
+
+# Manifest options which can only be changed by a reinstall
+INSTALL_OPTS = ('editpath', 'deps', 'sys', 'url', 'python', 'layer')
+
+
+def init(parser: ArgumentParser) -> None:
+    "Called to add command arguments to parser at init"
+    parser.add_argument(
+        '-n',
+        '--dry-run',
+        action='store_true',
+        help='just show the changes which would be made',
+    )
+    parser.add_argument(
+        '--no-remove',
+        action='store_true',
+        help='do not uninstall applications which are not in the manifest',
+    )
+    parser.add_argument(
+        '-B',
+        '--from-bundle',
+        metavar='DIR',
+        help='install offline, only from wheels in given bundle directory',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of applications to change in parallel, default is number of CPUs',
+    )
+    parser.add_argument('manifest', help='manifest file, or "-" for stdin')
+
+
+def _req_name(req: str) -> str:
+    "Return the normalized package name of a requirement"
+    from packaging.requirements import Requirement
+
+    return utils.normalize_name(Requirement(Path(req).name).name)
+
+
+def _read_manifest(path: str) -> dict[str, dict]:
+    "Read and validate the manifest, return the apps"
+    if path == '-':
+        manifest = json.load(sys.stdin)
+    else:
+        with utils.subenvars(path).open() as fp:
+            manifest = json.load(fp)
+
+    if not isinstance(manifest, dict) or not isinstance(
+        apps := manifest.get('apps'), dict
+    ):
+        raise TypeError('no "apps" object found')
+
+    for name, app in apps.items():
+        if not isinstance(app, dict):
+            raise TypeError(f'entry for {name} is not an object')
+
+    return apps
+
+
+def _plan(
+    args: Namespace, apps: dict[str, dict], pkgs: dict[str, dict]
+) -> dict[str, tuple[str, str]]:
+    "Return the (action, description) needed for each application"
+    plan = {}
+    for pkgname, app in apps.items():
+        if not (entry := pkgs.get(pkgname)):
+            plan[pkgname] = ('install', 'install')
+            continue
+
+        data = entry['data']
+        if changed := [k for k in INSTALL_OPTS if app.get(k) != data.get(k)]:
+            plan[pkgname] = ('reinstall', f'reinstall, {", ".join(changed)} changed')
+            continue
+
+        changes = []
+        if 'editpath' not in app and (vers := app.get('version')):
+            vdir = args._venvs_dir / str(entry['venv'])
+            cur = utils.installed_version(vdir, pkgname, args)
+            if cur != vers:
+                changes.append(f'{cur} -> {vers}')
+
+        add, remove = _injected_diff(app, data)
+        changes.extend(f'inject {p}' for p in add)
+        changes.extend(f'uninject {p}' for p in remove)
+        if changes:
+            plan[pkgname] = ('update', ', '.join(changes))
+
+    if not args.no_remove:
+        for pkgname in pkgs:
+            if pkgname not in apps:
+                plan[pkgname] = ('uninstall', 'uninstall')
+
+    return dict(sorted(plan.items()))
+
+
+def _injected_diff(app: dict, data: dict) -> tuple[list[str], list[str]]:
+    "Return the injected packages to add and remove"
+    cur = {_req_name(p): p for p in data.get('injected', [])}
+    want = {_req_name(p): p for p in app.get('injected', [])}
+    add = [p for n, p in want.items() if cur.get(n) != p]
+    remove = [n for n in cur if n not in want]
+    return add, remove
+
+
+def _install(args: Namespace, pkgname: str, app: dict, force: bool) -> str | None:
+    "Install the application as given in the manifest"
+    nargs = copy(args)
+    nargs.force = force
+    nargs.editable = bool(editpath := app.get('editpath'))
+    nargs.include_deps = bool(app.get('deps'))
+    nargs.system_site_packages = bool(app.get('sys'))
+    nargs.index_url = app.get('url')
+    nargs.python = app.get('python')
+    nargs.layer = app.get('layer')
+
+    if editpath:
+        pkg = str(Path(editpath).expanduser())
+    elif vers := app.get('version'):
+        pkg = f'{pkgname}=={vers}'
+    else:
+        pkg = pkgname
+
+    return install.install(
+        nargs, pkg, install.make_cmd_args(nargs), app.get('injected', [])
+    )
+
+
+def _update(args: Namespace, pkgname: str, app: dict) -> str | None:
+    "Update the version and injected packages of the application in place"
+    pkgname, vdir = utils.get_package_from_arg(pkgname, args)
+    if not vdir:
+        return f'Application {pkgname} is not installed.'
+
+    data = utils.get_json(vdir, args) or {}
+    add, remove = _injected_diff(app, data)
+    vers = app.get('version')
+    if (
+        not data.get('editpath')
+        and vers
+        and utils.installed_version(vdir, pkgname, args) != vers
+    ):
+        add.insert(0, f'{pkgname}=={vers}')
+
+    url = data.get('url')
+    pip_args = (
+        ['install']
+        + utils.compile_args(args)
+        + utils.make_args(
+            (args.verbose, '-v'), (url and not args.from_bundle, '-i', url)
+        )
+    )
+    pip_args += utils.bundle_args(args.from_bundle)
+
+    with generations.stage(args, pkgname, vdir) as wvdir:
+        if remove:
+            cmd = ['uninstall'] + utils.make_args((args.verbose, '-v')) + remove
+            if not utils.piprun(wvdir, args, cmd):
+                return f'Error: failed to uninstall "{remove}" from {pkgname}'
+
+        if add and not utils.piprun(wvdir, args, pip_args + add):
+            return f'Error: failed to install "{add}" to {pkgname}'
+
+        if injected := app.get('injected'):
+            data['injected'] = sorted(injected)
+        else:
+            data.pop('injected', None)
+
+        if err := utils.make_links(wvdir, pkgname, args, data):
+            return err
+
+        generations.switch(args, pkgname, wvdir)
+
+    print(f'{pkgname} updated.')
+    return None
+
+
+def main(args: Namespace) -> str | None:
+    "Called to action this command"
+    try:
+        apps = _read_manifest(args.manifest)
+    except (OSError, ValueError, TypeError) as e:
+        return f'Error: failed to read manifest "{args.manifest}": {e}'
+
+    plan = _plan(args, apps, registry.load(args))
+    if not plan:
+        print('All applications are in sync.')
+        return None
+
+    for pkgname, (_, desc) in plan.items():
+        print(f'{pkgname}: {desc}')
+
+    if args.dry_run:
+        return None
+
+    def sync(pkgname: str) -> str | None:
+        action = plan[pkgname][0]
+        if action == 'uninstall':
+            return uninstall.uninstall(args, pkgname)
+        if action == 'update':
+            return _update(args, pkgname, apps[pkgname])
+
+        return _install(args, pkgname, apps[pkgname], action == 'reinstall')
+
+    return utils.run_jobs(sync, list(plan), args.jobs)
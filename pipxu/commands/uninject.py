@@ -5,9 +5,7 @@ from __future__ import annotations
 
 from argparse import ArgumentParser, Namespace
 
-from .. import utils
-
-aliases = ['uj']
+from .. import generations, utils
 
 
 def init(parser: ArgumentParser) -> None:
@@ -24,7 +22,13 @@ def main(args: Namespace) -> str | None:
         return f'Application {pkgname} is not installed.'
 
     pip_args = ['uninstall'] + utils.make_args((args.verbose, '-v')) + args.extras
-    if not utils.piprun(vdir, args, pip_args):
-        return f'Error: failed to uninstall "{args.extras}" from {pkgname}'
+    with generations.stage(args, pkgname, vdir) as wvdir:
+        if not utils.piprun(wvdir, args, pip_args):
+            return f'Error: failed to uninstall "{args.extras}" from {pkgname}'
+
+        if err := utils.add_or_remove_pkg(wvdir, args, pkgname, args.extras, add=False):
+            return err
+
+        generations.switch(args, pkgname, wvdir)
 
-    return utils.add_or_remove_pkg(vdir, args, pkgname, args.extras, add=False)
+    return None
@@ -5,12 +5,10 @@ from __future__ import annotations
 
 from argparse import ArgumentParser, Namespace
 
-from .. import utils
+from .. import generations, utils
 
-aliases = ['remove', 'rm']
 
-
-def _uninstall(args: Namespace, pkgname: str) -> str | None:
+def uninstall(args: Namespace, pkgname: str) -> str | None:
     "Uninstall given package"
     pkgname, vdir = utils.get_package_from_arg(pkgname, args)
     if not vdir:
@@ -19,6 +17,8 @@ def _uninstall(args: Namespace, pkgname: str) -> str | None:
     if not utils.rm_package(pkgname, args):
         return f'Failed to uninstall {pkgname}.'
 
+    generations.remove_all(args, pkgname)
+
     print(f'{pkgname} uninstalled.')
     return None
 
@@ -43,7 +43,7 @@ def init(parser: ArgumentParser) -> None:
 def main(args: Namespace) -> str | None:
     "Called to action this command"
     for pkgname in utils.get_package_names(args):
-        if error := _uninstall(args, pkgname):
+        if error := uninstall(args, pkgname):
             return error
 
     return None
@@ -6,9 +6,7 @@ from __future__ import annotations
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
-from .. import utils
-
-aliases = ['update', 'up']
+from .. import generations, layers, utils
 
 
 def _upgrade(args: Namespace, pkgname: str) -> str | None:
@@ -20,21 +18,58 @@ def _upgrade(args: Namespace, pkgname: str) -> str | None:
     print(f'Upgrading {pkgname} ..')
     data = utils.get_json(vdir, args) or {}
     url = data.get('url')
-    pip_args = 'install --compile-bytecode -U'.split() + utils.make_args(
-        (args.verbose, '-v'), (url, '-i', url)
-    )
+    pip_args = ['install', '-U'] + utils.compile_args(args)
+    pip_args += utils.make_args((args.verbose, '-v'), (url, '-i', url))
     if editpath := data.get('editpath'):
-        pip_args.extend(['-e', str(Path(editpath).expanduser())])
+        reqs = ['-e', str(Path(editpath).expanduser())]
     else:
-        pip_args.extend([pkgname])
-
-    pip_args.extend(data.get('injected', []))
-
-    if not utils.piprun(vdir, args, pip_args):
-        return f'Error: failed to {args.name} {pkgname}'
-
-    if err := utils.make_links(vdir, pkgname, args, data):
-        return err
+        reqs = [pkgname]
+
+    injected = data.get('injected', [])
+    pip_args.extend(reqs + injected)
+    layer = data.get('layer')
+    index_args = utils.make_args((url, '-i', url))
+
+    # Avoid cloning the venv for a new generation if nothing would change.
+    # Editable packages may have changed their apps without changing version.
+    if args._keep_generations > 0 and not editpath:
+        if layer:
+            current = layers.is_current(args, vdir, reqs + injected, layer, index_args)
+        else:
+            dry_args = ['install', '--dry-run', '-U'] + index_args + reqs + injected
+            out = utils.piprun(vdir, args, dry_args, capture=True, merge=True)
+            current = bool(out) and 'Would make no changes' in out
+
+        if current:
+            print(f'{pkgname} is already up to date.')
+            return None
+
+    # Keep previous freeze list so we can see if anything changed
+    try:
+        oldfreeze = (vdir / args._freeze_file).read_text()
+    except OSError:
+        oldfreeze = None
+
+    with generations.stage(args, pkgname, vdir) as wvdir:
+        if layer:
+            reqs = [' '.join(reqs)] + injected
+            if err := layers.install(
+                args, wvdir, reqs, layer, index_args, upgrade=True
+            ):
+                return err
+        elif not utils.piprun(wvdir, args, pip_args):
+            return f'Error: failed to {args.name} {pkgname}'
+
+        # Nothing to relink or record if no packages changed. Editable
+        # packages may have changed their apps without changing version.
+        if not editpath and oldfreeze == utils.freeze(wvdir):
+            print(f'{pkgname} is already up to date.')
+            return None
+
+        if err := utils.make_links(wvdir, pkgname, args, data):
+            return err
+
+        generations.switch(args, pkgname, wvdir)
 
     print(f'{pkgname} upgraded.')
     return None
@@ -43,6 +78,17 @@ def _upgrade(args: Namespace, pkgname: str) -> str | None:
 def init(parser: ArgumentParser) -> None:
     "Called to add command arguments to parser at init"
     parser.add_argument('-v', '--verbose', action='store_true', help='give more output')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=utils.positive_int,
+        help='number of applications to upgrade in parallel, default is number of CPUs',
+    )
+    parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='deduplicate files of the upgraded venv[s] against all other venvs',
+    )
     parser.add_argument('--all', action='store_true', help='upgrade ALL applications')
     parser.add_argument(
         '--skip',
@@ -59,8 +105,17 @@ def init(parser: ArgumentParser) -> None:
 
 def main(args: Namespace) -> str | None:
     "Called to action this command"
-    for pkgname in utils.get_package_names(args):
-        if error := _upgrade(args, pkgname):
-            return error
+    if args.dedupe:
+        args._changed_vdirs = []
 
-    return None
+    err = utils.run_jobs(
+        lambda p: _upgrade(args, p), utils.get_package_names(args), args.jobs
+    )
+
+    if args.dedupe and args._changed_vdirs:
+        from .. import filestore
+        from .dedupe import report
+
+        err = report(filestore.dedupe(args, args._changed_vdirs)) or err
+
+    return err
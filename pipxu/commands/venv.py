@@ -3,12 +3,14 @@
 
 from __future__ import annotations
 
-import platform
+import sys
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
 from .. import utils
 
+uses_uv = False
+
 
 def init(parser: ArgumentParser) -> None:
     "Called to add command arguments to parser at init"
@@ -42,11 +44,10 @@ def main(args: Namespace) -> str | None:
     if args.package:
         pkgs = dict(utils.get_package_from_arg(p, args) for p in args.package)
     else:
-        all_pkgs = {p.name: p.resolve() for p in args._packages_dir.iterdir()}
+        all_pkgs = {n: v for n, v, _ in utils.get_all_pkg_venvs(args)}
 
         def keycmp(k: str) -> int:
-            val = all_pkgs.get(k, '/0')
-            return int(val.name)
+            return int(all_pkgs[k].name)
 
         key = keycmp if args.sort_venv else None
         pkgs = {k: all_pkgs[k] for k in sorted(all_pkgs, key=key)}
@@ -58,7 +59,7 @@ def main(args: Namespace) -> str | None:
         path = vdir if args.path_full else Path(utils.unexpanduser(vdir))
 
         if args.path_python:
-            if platform.system() == 'Windows':
+            if sys.platform == 'win32':
                 path = path / 'Scripts' / 'python.exe'
             else:
                 path = path / 'bin' / 'python'
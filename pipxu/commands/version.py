@@ -7,6 +7,8 @@ from argparse import ArgumentParser, Namespace
 
 from .. import utils
 
+uses_uv = False
+
 
 def init(parser: ArgumentParser) -> None:
     "Called to add command arguments to parser at init"
@@ -31,7 +33,7 @@ def main(args: Namespace) -> str | None:
         if not vdir:
             return f'Application {pkgname} not found.'
 
-        if not (versions := utils.get_versions(args._packages_dir / pkgname, args)):
+        if not (versions := utils.get_versions(vdir)):
             return f'Application {pkgname} versions not found.'
 
         # Reorder version dict to put pkgname first
@@ -46,9 +48,8 @@ def main(args: Namespace) -> str | None:
 
         return None
 
-    for pdir, data in utils.get_all_pkg_venvs(args):
-        package = pdir.name
-        if versions := utils.get_versions(pdir, args):
-            display(package, versions.get(package, ('unknown', None)))
+    for package, vdir, _ in utils.get_all_pkg_venvs(args):
+        versions = utils.get_versions(vdir, package)
+        display(package, versions.get(package, ('unknown', None)))
 
     return None
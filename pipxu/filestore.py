@@ -0,0 +1,264 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Content-addressed deduplication of files across venvs.
+
+Files in the venvs directory are bucketed by size (and mode), and only
+files which share a bucket with another file are hashed. Files with the
+same hash are then replaced by hard links to one copy (or by reflinks,
+if requested and the filesystem supports them). The stat and hash of
+every file is cached in an index in PIPXU_HOME so later runs only hash
+new or changed files, and so a single venv can be deduplicated against
+all the others without scanning them.
+
+The top level files (e.g. metadata) and bin/ directory of each venv are
+never touched since they are specific to each venv. Python source files
+are only linked to files with the same modification time so their
+existing bytecode stays valid.
+"""
+
+from __future__ import annotations
+
+import errno
+import hashlib
+import json
+import os
+import sys
+from argparse import Namespace
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import utils
+
+INDEX_FILE = 'dedupe_index.json'
+
+# Linux ioctl to clone (reflink) a file
+FICLONE = 0x40049409
+
+# Errors which indicate the filesystem can not reflink
+NO_REFLINK_ERRORS = (errno.EOPNOTSUPP, errno.EINVAL, errno.EXDEV, errno.ENOTTY)
+
+# Index entry fields
+INO, SIZE, MTIME, MODE, HASH, CLONED = range(6)
+
+
+class Stats:
+    "Counts of the work done"
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.hashed = 0
+        self.linked = 0
+        self.saved = 0
+        self.error: str | None = None
+
+
+def _stat_entry(path: str, old: list | None) -> list | None:
+    "Return the index entry for the file, reusing the old hash if unchanged"
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+
+    if old and old[INO] == st.st_ino and old[MTIME] == st.st_mtime_ns:
+        return old
+
+    return [st.st_ino, st.st_size, st.st_mtime_ns, st.st_mode, None, False]
+
+
+def _scan(vdirs: Iterable[Path], index: dict) -> dict[str, list]:
+    "Return index entries for all regular files in the given venvs"
+    entries = {}
+    for vdir in vdirs:
+        for root, dirs, files in os.walk(vdir):
+            if root == str(vdir):
+                # Skip the venv specific top level files and scripts
+                dirs[:] = [d for d in dirs if d != 'bin']
+                continue
+            for name in files:
+                path = os.path.join(root, name)
+                if (entry := _stat_entry(path, index.get(path))) and (
+                    entry[MODE] & 0o170000 == 0o100000 and entry[SIZE] > 0
+                ):
+                    entries[path] = entry
+
+    return entries
+
+
+def _hash(path: str) -> str | None:
+    "Return the sha256 of the file"
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fp:
+            while chunk := fp.read(1 << 20):
+                h.update(chunk)
+    except OSError:
+        return None
+
+    return h.hexdigest()
+
+
+def _key(path: str, entry: list) -> tuple:
+    "Return the key of files which may be linked together"
+    # Python bytecode records the source mtime so only link sources
+    # which have the same mtime (in secs)
+    mtime = entry[MTIME] // 1_000_000_000 if path.endswith('.py') else None
+    return entry[SIZE], entry[MODE], mtime
+
+
+def _reflink(src: str, tmp: str) -> None:
+    "Create tmp as a reflink clone of src"
+    import fcntl
+
+    with open(src, 'rb') as sfp, open(tmp, 'wb') as tfp:
+        fcntl.ioctl(tfp.fileno(), FICLONE, sfp.fileno())
+
+    st = os.stat(src)
+    os.chmod(tmp, st.st_mode)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _link(src: str, dst: str, reflink: bool) -> None:
+    "Atomically replace dst with a link to src"
+    tmp = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.dedupe')
+    try:
+        if reflink:
+            _reflink(src, tmp)
+        else:
+            os.link(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _dedupe_group(
+    paths: list[str], entries: dict[str, list], reflink: bool, stats: Stats
+) -> None:
+    "Link together the given files which all have the same content"
+    # Use the most linked inode as the master copy so fewer files change
+    inodes: dict[int, list[str]] = {}
+    for path in paths:
+        inodes.setdefault(entries[path][INO], []).append(path)
+
+    master = max(inodes.values(), key=lambda p: (len(p), p[0]))[0]
+    mentry = entries[master]
+    for path in paths:
+        entry = entries[path]
+        if entry[INO] == mentry[INO] or entry[CLONED]:
+            continue
+
+        # Make sure neither file has changed since it was hashed
+        if _stat_entry(path, entry) is not entry or (
+            _stat_entry(master, mentry) is not mentry
+        ):
+            continue
+
+        _link(master, path, reflink)
+        stats.linked += 1
+        stats.saved += entry[SIZE]
+        if reflink:
+            st = os.lstat(path)
+            entries[path] = [st.st_ino, st.st_size, st.st_mtime_ns, st.st_mode]
+            entries[path] += [entry[HASH], True]
+        else:
+            entries[path] = list(mentry)
+
+
+def _load(args: Namespace) -> dict[str, list]:
+    "Load the index"
+    try:
+        with (args._home_dir / INDEX_FILE).open() as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(args: Namespace, entries: dict[str, list]) -> None:
+    "Atomically write the index"
+    utils._write_text(args._home_dir / INDEX_FILE, json.dumps(entries))
+
+
+def dedupe(
+    args: Namespace,
+    vdirs: list[Path] | None = None,
+    *,
+    reflink: bool = False,
+    jobs: int | None = None,
+) -> Stats:
+    "Deduplicate the given venvs (or all venvs) against all other venvs"
+    from filelock import FileLock
+
+    stats = Stats()
+    with FileLock(args._home_dir / f'.{INDEX_FILE}.lock'):
+        index = _load(args)
+
+        # Ignore venvs which are being created or changed right now
+        busy = {str(v) for _, v, alive in utils.get_journal(args) if alive}
+        allvdirs = {str(v) for v in args._venvs_dir.iterdir() if v.is_dir()} - busy
+
+        if vdirs is None:
+            targets = allvdirs
+        else:
+            targets = {str(v.resolve()) for v in vdirs} & allvdirs
+
+        entries = _scan((Path(v) for v in sorted(targets)), index)
+        if vdirs is not None:
+            # Use the cached entries for all the other venvs
+            start = len(str(args._venvs_dir)) + 1
+            for path, entry in index.items():
+                vdir = path[: path.find(os.sep, start)]
+                if vdir in allvdirs and vdir not in targets:
+                    entries.setdefault(path, entry)
+
+        stats.files = len(entries)
+
+        # Bucket by size etc, and we only need to hash files in buckets
+        # with more than one distinct inode which include a target file
+        buckets: dict[tuple, list[str]] = {}
+        for path, entry in entries.items():
+            buckets.setdefault(_key(path, entry), []).append(path)
+
+        def is_target(path: str) -> bool:
+            return vdirs is None or any(path.startswith(t + os.sep) for t in targets)
+
+        tohash = []
+        groups = []
+        for paths in buckets.values():
+            if len({entries[p][INO] for p in paths}) > 1 and any(
+                is_target(p) for p in paths
+            ):
+                groups.append(paths)
+                tohash.extend(p for p in paths if not entries[p][HASH])
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as ex:
+            for path, digest in zip(tohash, ex.map(_hash, tohash)):
+                entries[path][HASH] = digest
+                stats.hashed += 1
+
+        for paths in groups:
+            hashes: dict[str, list[str]] = {}
+            for path in paths:
+                if digest := entries[path][HASH]:
+                    hashes.setdefault(digest, []).append(path)
+
+            for same in hashes.values():
+                if len(same) < 2:
+                    continue
+                try:
+                    _dedupe_group(same, entries, reflink, stats)
+                except OSError as e:
+                    if reflink and e.errno in NO_REFLINK_ERRORS:
+                        stats.error = 'Error: filesystem does not support reflinks.'
+                        break
+                    print(f'Error: {same[0]}: {e}', file=sys.stderr)
+
+            if stats.error:
+                break
+
+        _save(args, entries)
+
+    return stats
@@ -0,0 +1,137 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Retained previous venv generations of applications, for rollback.
+
+When keeping generations, commands which modify an application's venv
+instead modify a clone of it (hard linked, so it costs little disk
+space) and then atomically switch the application to the clone. The
+previous venv is retained intact, and recorded as a symlink in
+PIPXU_HOME/generations/<app>/ so the application can be switched back
+to it instantly.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from argparse import Namespace
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import utils
+
+GEN_DIR = 'generations'
+
+
+def _gendir(args: Namespace, pkgname: str) -> Path:
+    "Return the directory of generations for the given package"
+    return args._home_dir / GEN_DIR / pkgname
+
+
+def get(args: Namespace, pkgname: str) -> list[Path]:
+    "Return the generation links of the given package, most recent first"
+    gdir = _gendir(args, pkgname)
+    if not gdir.is_dir():
+        return []
+
+    links = [f for f in gdir.iterdir() if not f.name.startswith('.')]
+    return sorted(links, key=lambda f: f.lstat().st_mtime_ns, reverse=True)
+
+
+def get_all(args: Namespace) -> Iterator[tuple[str, Path]]:
+    "Yield (pkgname, generation link) for all generations of all packages"
+    gdir = args._home_dir / GEN_DIR
+    if gdir.is_dir():
+        for pdir in gdir.iterdir():
+            for link in pdir.iterdir():
+                yield pdir.name, link
+
+
+def _clone(src: Path, dst: Path) -> None:
+    "Clone a venv, using hard links for all files"
+    shutil.copytree(src, dst, symlinks=True, copy_function=os.link, dirs_exist_ok=True)
+
+    # Scripts refer to the venv by absolute path so give the clone its own
+    # rewritten copies of those
+    oldpath = str(src).encode()
+    newpath = str(dst).encode()
+    for file in utils.vdir_bin(dst).iterdir():
+        if file.is_symlink() or not file.is_file():
+            continue
+
+        if oldpath in (data := file.read_bytes()):
+            mode = file.stat().st_mode
+            file.unlink()
+            file.write_bytes(data.replace(oldpath, newpath))
+            file.chmod(mode)
+
+
+def remove(args: Namespace, link: Path) -> None:
+    "Remove the given generation and its venv"
+    vdir = link.resolve()
+    link.unlink()
+    if vdir.parent == args._venvs_dir:
+        utils.rm_vdir(vdir, args)
+
+
+def retire(args: Namespace, pkgname: str, vdir: Path, *, evict: bool = True) -> None:
+    "Retire a replaced venv, keeping it as a generation if configured"
+    if args._keep_generations <= 0 and evict:
+        utils.rm_vdir(vdir, args)
+    else:
+        # Remove any links still pointing to it (i.e. for apps which no
+        # longer exist) and record it as the most recent generation
+        utils.unlink_vdir(vdir, args)
+        gdir = _gendir(args, pkgname)
+        gdir.mkdir(parents=True, exist_ok=True)
+        utils.symlink(vdir, gdir / vdir.name)
+
+    if evict:
+        for link in get(args, pkgname)[max(args._keep_generations, 0) :]:
+            remove(args, link)
+
+
+def remove_all(args: Namespace, pkgname: str) -> None:
+    "Remove all generations of the given package"
+    for link in get(args, pkgname):
+        remove(args, link)
+
+    shutil.rmtree(_gendir(args, pkgname), ignore_errors=True)
+
+
+def switch(args: Namespace, pkgname: str, vdir: Path) -> None:
+    "Atomically switch the package to use the given venv"
+    pdir = args._packages_dir / pkgname
+    if pdir.resolve() != vdir:
+        utils.symlink(vdir, pdir)
+
+
+@contextmanager
+def stage(args: Namespace, pkgname: str, vdir: Path) -> Iterator[Path]:
+    """
+    Yield the venv to modify, i.e. vdir itself, or a clone of it if we
+    are keeping generations.
+
+    The caller must call switch() to commit the clone once it is
+    complete, otherwise it is discarded. After a switch, the original
+    venv is retained as a generation.
+    """
+    if args._keep_generations <= 0:
+        yield vdir
+        return
+
+    pdir = args._packages_dir / pkgname
+    with utils.new_vdir(args) as newvdir:
+        try:
+            _clone(vdir, newvdir)
+            yield newvdir
+        finally:
+            if not (committed := pdir.resolve() == newvdir):
+                # Restore any links we changed back to the original venv
+                if utils.unlink_vdir(newvdir, args):
+                    utils.make_links(vdir, pkgname, args, None)
+                utils.rm_vdir(newvdir, args)
+
+    if committed:
+        retire(args, pkgname, vdir)
@@ -0,0 +1,231 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Query package indexes for available versions.
+
+Uses the simple repository API (PEP 691 JSON, falling back to PEP 503
+HTML) with an on-disk HTTP cache of the responses. Files which do not
+support the python of the application (i.e. its requires-python) are
+ignored. Cached responses are
+used as is within their TTL, then revalidated with ETag/Last-Modified,
+and evicted once they have not been used for a while. An index may also
+be a local directory (or file:// URL) of per-package subdirectories of
+distribution files.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from argparse import Namespace
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlparse
+from urllib.request import Request, url2pathname, urlopen
+
+from . import utils
+
+DEFAULT_INDEX = 'https://pypi.org/simple'
+CACHE_DIR = 'cache/simple'
+TIMEOUT = 30
+
+# Remove cache entries not used for this long (secs)
+EVICT_AGE = 7 * 24 * 60 * 60
+
+ACCEPT = (
+    'application/vnd.pypi.simple.v1+json, '
+    'application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.1'
+)
+
+SDIST_EXTS = ('.tar.gz', '.zip', '.tar.bz2', '.tgz')
+
+
+class _LinkParser(HTMLParser):
+    "Collect the anchor texts and file attributes from a simple HTML page"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.files: list[dict] = []
+        self._attrs: dict | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._attrs = dict(attrs)
+
+    def handle_data(self, data):
+        if self._attrs is not None and (name := data.strip()):
+            self.files.append(
+                {
+                    'filename': name,
+                    'yanked': 'data-yanked' in self._attrs,
+                    'requires-python': self._attrs.get('data-requires-python'),
+                }
+            )
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._attrs = None
+
+
+def default_index() -> str:
+    "Return the default index URL, as uv would use"
+    return (
+        os.getenv('UV_DEFAULT_INDEX')
+        or os.getenv('UV_INDEX_URL')
+        or os.getenv('PIP_INDEX_URL')
+        or DEFAULT_INDEX
+    )
+
+
+def _version(filename: str, pkgname: str) -> str | None:
+    "Return the version from a distribution filename"
+    if filename.endswith('.whl'):
+        parts = filename.split('-')
+        return parts[1] if len(parts) >= 5 else None
+
+    for ext in SDIST_EXTS:
+        if filename.endswith(ext):
+            stem = filename[: -len(ext)]
+            # Sdist names are not reliably normalized so match loosely
+            pat = pkgname.replace('-', '[-_.]+') + '-'
+            if m := re.match(pat, stem, re.IGNORECASE):
+                return stem[m.end() :]
+            return None
+
+    return None
+
+
+def _supports(requires: str | None, python: str | None) -> bool:
+    "Return True if the requires-python of a file allows the given python"
+    if not requires or not python:
+        return True
+
+    from packaging.specifiers import InvalidSpecifier, SpecifierSet
+
+    try:
+        return SpecifierSet(requires).contains(python, prereleases=True)
+    except InvalidSpecifier:
+        return True
+
+
+def _parse(
+    body: str, content_type: str, pkgname: str, python: str | None = None
+) -> list[str]:
+    "Return the non-yanked versions from an index page, for the python if given"
+    if 'json' in content_type:
+        files = json.loads(body).get('files', [])
+    else:
+        parser = _LinkParser()
+        parser.feed(body)
+        files = parser.files
+
+    versions = set()
+    for f in files:
+        if (
+            not f.get('yanked')
+            and _supports(f.get('requires-python'), python)
+            and (v := _version(f['filename'], pkgname))
+        ):
+            versions.add(v)
+
+    return sorted(versions)
+
+
+class Cache:
+    "On-disk HTTP cache of index pages"
+
+    def __init__(self, args: Namespace, ttl: float, refresh: bool = False) -> None:
+        self.dir = args._home_dir / CACHE_DIR
+        self.ttl = ttl
+        self.refresh = refresh
+
+    def _file(self, url: str) -> Path:
+        "Return the cache file for the given URL"
+        return self.dir / (hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def _load(self, url: str) -> dict | None:
+        "Return the cache entry for the given URL, if any"
+        try:
+            with self._file(url).open() as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        return entry if entry.get('url') == url else None
+
+    def _save(self, entry: dict) -> None:
+        "Atomically write a cache entry"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        utils._write_text(self._file(entry['url']), json.dumps(entry))
+
+    def get(self, url: str) -> tuple[str, str]:
+        "Return (body, content_type) for the URL, from the cache if possible"
+        now = time.time()
+        entry = self._load(url)
+        if entry and not self.refresh and now - entry['time'] < self.ttl:
+            return entry['body'], entry['type']
+
+        headers = {'Accept': ACCEPT}
+        if entry:
+            if etag := entry.get('etag'):
+                headers['If-None-Match'] = etag
+            if modified := entry.get('modified'):
+                headers['If-Modified-Since'] = modified
+
+        try:
+            with urlopen(Request(url, headers=headers), timeout=TIMEOUT) as res:
+                entry = {
+                    'url': url,
+                    'etag': res.headers.get('ETag'),
+                    'modified': res.headers.get('Last-Modified'),
+                    'type': res.headers.get('Content-Type', ''),
+                    'body': res.read().decode(res.headers.get_content_charset('utf-8')),
+                }
+        except HTTPError as e:
+            if e.code != 304 or not entry:
+                raise
+
+        entry['time'] = now
+        self._save(entry)
+        return entry['body'], entry['type']
+
+    def evict(self) -> None:
+        "Remove cache entries which have not been used for a while"
+        if not self.dir.is_dir():
+            return
+
+        old = time.time() - max(EVICT_AGE, self.ttl)
+        for file in self.dir.iterdir():
+            try:
+                if file.stat().st_mtime < old:
+                    file.unlink()
+            except OSError:
+                pass
+
+
+def _local_versions(path: Path, pkgname: str) -> list[str]:
+    "Return the versions in a local directory index"
+    pdir = path / pkgname
+    if not pdir.is_dir():
+        raise FileNotFoundError(f'"{pdir}" not found')
+
+    versions = {_version(f.name, pkgname) for f in pdir.iterdir()}
+    versions.discard(None)
+    return sorted(versions)  # type: ignore
+
+
+def get_versions(
+    cache: Cache, index_url: str, pkgname: str, python: str | None = None
+) -> list[str]:
+    "Return all available versions of the package from the index, for the python"
+    url = urlparse(index_url)
+    if not url.scheme or url.scheme == 'file':
+        path = url2pathname(url.path) if url.scheme else index_url
+        return _local_versions(Path(path).expanduser(), pkgname)
+
+    page = urljoin(index_url.rstrip('/') + '/', f'{pkgname}/')
+    body, content_type = cache.get(page)
+    return _parse(body, content_type, pkgname, python)
@@ -0,0 +1,231 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Shared dependency layer venvs.
+
+An application installed with layer requirements has its full set of
+dependencies resolved and pinned first. The pinned dependencies of the
+layer requirements are installed in a layer venv in PIPXU_HOME/layers/,
+keyed by a hash of the python and the pinned set, so any other
+application which resolves to the same set shares the same layer. The
+application venv refers to the layer through a .pth file, and only the
+residual packages not in the layer are installed in the application
+venv itself. Layers are never changed once created, and are removed
+by the purge/gc command once no venv refers to them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from argparse import Namespace
+from pathlib import Path
+
+from . import trash, utils
+from .run import run
+
+LAYERS_DIR = 'layers'
+
+
+def _python(vdir: Path) -> str:
+    "Return the real python executable of the venv"
+    return str((utils.vdir_bin(vdir) / 'python').resolve())
+
+
+def _compile(
+    args: Namespace,
+    python: str,
+    reqs: list[str],
+    index_args: list[str],
+    *,
+    constraints: list[str] | None = None,
+    upgrade: bool = False,
+) -> list[str] | None:
+    "Resolve the requirements, return the pinned requirements"
+    with tempfile.TemporaryDirectory() as tdir:
+        reqfile = Path(tdir, 'requirements.in')
+        reqfile.write_text('\n'.join(reqs) + '\n')
+        cmd = [args._uv, 'pip', 'compile', '-q', '--no-header', '--no-annotate']
+        cmd += ['-p', python] + index_args
+        cmd += utils.make_args((upgrade, '--upgrade'))
+        if constraints:
+            cfile = Path(tdir, 'constraints.txt')
+            cfile.write_text('\n'.join(constraints) + '\n')
+            cmd += ['-c', str(cfile)]
+
+        out = run(cmd + [str(reqfile)], capture=True)
+
+    if out is None:
+        return None
+
+    return [ln.strip() for ln in out.splitlines() if ln.strip() and ln[0] != '#']
+
+
+def named_pins(pins: list[str]) -> list[str]:
+    "Return only the pins of named packages to exact versions"
+    return [p for p in pins if re.match(r'[A-Za-z0-9][-A-Za-z0-9._]*==\S', p)]
+
+
+def _ensure(
+    args: Namespace, python: str, pins: list[str], index_args: list[str]
+) -> Path | str:
+    "Return the layer venv for the given pins, creating it if needed"
+    key = hashlib.sha256('\n'.join([python] + sorted(pins)).encode()).hexdigest()
+    ldir = args._home_dir / LAYERS_DIR / key[:16]
+    freeze = ldir / args._freeze_file
+
+    # The freeze file is written last so marks the layer as complete.
+    # Touch the layer when reused so it is not purged before it is used.
+    if freeze.exists():
+        os.utime(ldir)
+        return ldir
+
+    from filelock import FileLock
+
+    ldir.parent.mkdir(exist_ok=True)
+    with FileLock(ldir.with_name(f'.{ldir.name}.lock')):
+        if freeze.exists():
+            return ldir
+
+        print(f'Creating layer "{ldir}" of {len(pins)} packages ..')
+        shutil.rmtree(ldir, ignore_errors=True)
+        if not run([args._uv, 'venv', '-q', '-p', python, str(ldir)]):
+            return f'Error: failed to create layer {ldir}.'
+
+        # Layers are shared and never changed, so always compile them now
+        pinfile = ldir / 'requirements.txt'
+        pinfile.write_text('\n'.join(pins) + '\n')
+        pip_args = ['sync', '--compile-bytecode'] + index_args
+        pip_args += utils.make_args((args.verbose, '-v'))
+        if not utils.piprun(ldir, args, pip_args + [str(pinfile)]):
+            shutil.rmtree(ldir, ignore_errors=True)
+            return f'Error: failed to install layer {ldir}.'
+
+        freeze.write_text(utils.freeze(ldir))
+
+    return ldir
+
+
+def _attach(vdir: Path, ldir: Path) -> None:
+    "Make the venv use the given layer"
+    # Replace rather than rewrite the file since it may be hard linked
+    # to the same file in other venvs, e.g. generations
+    lines = ''.join(utils.layer_pth_line(d) for d in utils.site_packages(ldir))
+    for sdir in utils.site_packages(vdir):
+        utils._write_text(sdir / utils.LAYER_PTH, lines)
+
+
+def get_layer(vdir: Path) -> Path | None:
+    "Return the layer used by the venv, if any"
+    if sdirs := utils.layer_site_packages(vdir):
+        return sdirs[0].parent.parent.parent
+
+    return None
+
+
+def _sync(
+    args: Namespace, vdir: Path, pins: list[str], index_args: list[str]
+) -> str | None:
+    "Install exactly the given pinned packages in the venv"
+    with tempfile.TemporaryDirectory() as tdir:
+        pinfile = Path(tdir, 'requirements.txt')
+        pinfile.write_text('\n'.join(pins) + '\n')
+        pip_args = ['sync'] + utils.compile_args(args) + index_args
+        pip_args += utils.make_args((args.verbose, '-v'))
+        return utils.piprun(vdir, args, pip_args + [str(pinfile)])
+
+
+def install(
+    args: Namespace,
+    vdir: Path,
+    reqs: list[str],
+    layer_reqs: list[str],
+    index_args: list[str],
+    *,
+    upgrade: bool = False,
+) -> str | None:
+    "Install the requirements in the venv, sharing the layer dependencies"
+    python = _python(vdir)
+    if not (
+        pins := _compile(args, python, reqs + layer_reqs, index_args, upgrade=upgrade)
+    ):
+        return f'Error: failed to resolve {reqs + layer_reqs}.'
+
+    # Resolve the layer requirements within the full set so the layer
+    # only contains the same versions the application needs. Unnamed
+    # (editable, path, URL) pins can not be constraints, and are left
+    # to be installed in the application venv anyway.
+    named = named_pins(pins)
+    if not (base := _compile(args, python, layer_reqs, index_args, constraints=named)):
+        return f'Error: failed to resolve layer {layer_reqs}.'
+
+    ldir = _ensure(args, python, base, index_args)
+    if isinstance(ldir, str):
+        return ldir
+
+    _attach(vdir, ldir)
+    baseset = set(base)
+    if not _sync(args, vdir, [p for p in pins if p not in baseset], index_args):
+        return f'Error: failed to install {reqs}.'
+
+    return None
+
+
+def is_current(
+    args: Namespace,
+    vdir: Path,
+    reqs: list[str],
+    layer_reqs: list[str],
+    index_args: list[str],
+) -> bool:
+    "Return True if upgrading the venv would not change any named packages"
+    pins = _compile(args, _python(vdir), reqs + layer_reqs, index_args, upgrade=True)
+    return pins is not None and set(named_pins(pins)) == set(
+        named_pins(utils.freeze(vdir).splitlines())
+    )
+
+
+def copy(
+    args: Namespace, vdir: Path, newvdir: Path, index_args: list[str]
+) -> str | None:
+    "Install the same packages and layer as the old venv in the new venv"
+    if (
+        not (ldir := get_layer(vdir))
+        or not (freeze := ldir / args._freeze_file).exists()
+    ):
+        return f'Error: layer for "{vdir}" not found.'
+
+    # The new venv may use a different python so may need a new layer
+    base = freeze.read_text().splitlines()
+    newldir = _ensure(args, _python(newvdir), base, index_args)
+    if isinstance(newldir, str):
+        return newldir
+
+    _attach(newvdir, newldir)
+    baseset = set(base)
+    pins = (vdir / args._freeze_file).read_text().splitlines()
+    if not _sync(args, newvdir, [p for p in pins if p not in baseset], index_args):
+        return f'Error: failed to install packages in "{newvdir}".'
+
+    return None
+
+
+def purge(args: Namespace, vdirs: list[Path]) -> None:
+    "Remove layers which are not used by any of the given venvs"
+    import time
+
+    if not (ldirs := args._home_dir / LAYERS_DIR).is_dir():
+        return
+
+    used = {get_layer(v) for v in vdirs}
+
+    # Ignore new layers which may be about to be used by an install
+    old = time.time() - 3600
+    for ldir in ldirs.iterdir():
+        if ldir.name.startswith('.') or ldir in used or ldir.stat().st_mtime > old:
+            continue
+        print(f'Purging unused layer "{ldir}"')
+        trash.move(args, ldir)
+        ldir.with_name(f'.{ldir.name}.lock').unlink(missing_ok=True)
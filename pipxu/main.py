@@ -7,22 +7,21 @@ pipx but uses uv instead of venv + pip.
 
 from __future__ import annotations
 
+import argparse
 import importlib
 import os
-import platform
 import sys
 from pathlib import Path
 
-import platformdirs
 from argparse_from_file import ArgumentParser
 
-from . import utils
-from .run import run
-
 DEFUV = 'uv'
 MIN_UV_VERSION = '0.1.34'
 DEFPY = 'python3'
 
+# Interval between automatic purges of stray files (secs)
+PURGE_INTERVAL = 24 * 60 * 60
+
 # Some constants
 BASEDIR = Path(__file__).parent
 PROG = BASEDIR.stem
@@ -45,6 +44,8 @@ def path_check(env_name: str, dir: str) -> str:
 
 def man_path_check(env_name: str, dir: str) -> str:
     "Check and report that users MANPATH is set up correctly"
+    from .run import run
+
     path = run(['manpath'], capture=True, ignore_error=True) or os.getenv('MANPATH')
     if not path or dir not in path.split(':'):
         return f'Your MANPATH does not contain {env_name} ({dir}).'
@@ -52,8 +53,78 @@ def man_path_check(env_name: str, dir: str) -> str:
     return f'Your MANPATH contains {env_name} ({dir}).'
 
 
+class CommandParser(argparse.ArgumentParser):
+    "Command parser which only imports its command module when it is used"
+
+    def __init__(self, *args, command: str, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.command = command
+
+    def parse_known_args(self, args=None, namespace=None):
+        if not self.get_default('func'):
+            mod = importlib.import_module(f'{PROG}.commands.{self.command}')
+            self.description = mod.__doc__
+
+            if hasattr(mod, 'init'):
+                mod.init(self)
+
+            if not hasattr(mod, 'main'):
+                self.error(f'"{self.command}" command must define a main()')
+
+            self.set_defaults(
+                func=mod.main,
+                parser=self,
+                name=self.command,
+                _uses_uv=getattr(mod, 'uses_uv', True),
+            )
+
+        return super().parse_known_args(args, namespace)
+
+
+def check_uv(uv: str, cachefile: Path) -> str | None:
+    "Check uv is available and recent enough, caching the result"
+    import json
+    import shutil
+
+    from .run import run
+
+    # Key the cache on the identity of the uv executable
+    if path := shutil.which(uv):
+        stat = Path(path).resolve().stat()
+        key = [path, stat.st_mtime_ns, stat.st_ino]
+        try:
+            with cachefile.open() as fp:
+                if json.load(fp) == key:
+                    return None
+        except (OSError, ValueError):
+            pass
+
+    if not (verstr := run((uv, '--version'), capture=True, ignore_error=True)):
+        if uv != DEFUV:
+            return f'Error: specified uv "{uv}" program not found.'
+
+        return (
+            f'Error: {uv} program must be installed, and in your PATH '
+            'or specified with --uv option.'
+        )
+
+    uv_vers = verstr.split()[1]
+    if calc_version(uv_vers) < calc_version(MIN_UV_VERSION):
+        return (
+            f'Error: {uv} version is {uv_vers} but must be at least {MIN_UV_VERSION}.'
+        )
+
+    if path:
+        cachefile.write_text(json.dumps(key))
+
+    return None
+
+
 def main() -> str | None:
     "Main code"
+    # Only import the rest of our modules as needed, for a fast startup
+    from .commands import COMMANDS
+
     mainparser = ArgumentParser(
         description=__doc__,
         epilog='Some commands offer aliases as shown in parentheses above. '
@@ -74,39 +145,60 @@ def main() -> str | None:
     mainparser.add_argument(
         '--default-python', help=f'path to default python executable, default="{DEFPY}"'
     )
+    mainparser.add_argument(
+        '-k',
+        '--keep-generations',
+        type=int,
+        metavar='N',
+        help='keep N previous venv generations of each application when '
+        'changed, for rollback. Can also be set as '
+        f'{PROGU}_KEEP_GENERATIONS, default is 0',
+    )
+    mainparser.add_argument(
+        '--defer-compile',
+        action='store_true',
+        help='do not compile bytecode when installing, instead queue venvs '
+        'to be compiled later with the compile command. Can also be set as '
+        f'{PROGU}_DEFER_COMPILE',
+    )
+    mainparser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='write a timing trace of all subprocess runs to FILE '
+        f'in Chrome trace event format, or set {PROGU}_TRACE',
+    )
     mainparser.add_argument(
         '-V',
         '--version',
         action='store_true',
         help=f'just print {PROG} version and exit',
     )
-    subparser = mainparser.add_subparsers(title='Commands', dest='func')
-
-    # Iterate over the commands to set up their parsers
-    for modfile in sorted((BASEDIR / 'commands').glob('[!_]*.py')):
-        name = modfile.stem
-        mod = importlib.import_module(f'{PROG}.commands.{name}')
-        aliases = mod.aliases if hasattr(mod, 'aliases') else []
-        docstr = mod.__doc__.strip().split('\n\n')[0] if mod.__doc__ else None
-        parser = subparser.add_parser(
-            name, description=mod.__doc__, help=docstr, aliases=aliases
-        )
+    subparser = mainparser.add_subparsers(
+        title='Commands', dest='func', parser_class=CommandParser
+    )
 
-        if hasattr(mod, 'init'):
-            mod.init(parser)
+    # Set up a parser for each command. The command module is only
+    # imported (and its arguments added) if that command is invoked.
+    for name, (aliases, docstr) in COMMANDS.items():
+        subparser.add_parser(name, help=docstr, aliases=aliases, command=name)
 
-        if not hasattr(mod, 'main'):
-            mainparser.error(f'"{name}" command must define a main()')
+    args = mainparser.parse_args()
 
-        parser.set_defaults(func=mod.main, parser=parser, name=name)
+    from . import profiling, trace, utils
 
-    args = mainparser.parse_args()
+    # Profile ourself if requested in the environment
+    if mode := profiling.get_mode():
+        if err := profiling.check_mode(mode):
+            return err
+
+        if mode == 'importtime':
+            sys.exit(profiling.importtime(getattr(args, 'name', None) or PROG))
 
     if args.version:
         print(f'{PROG}=={utils.version()}')
         return None
 
-    if platform.system() == 'Windows':
+    if sys.platform == 'win32':
         return 'Error: Sorry, Windows platform is not supported.'
 
     is_root = os.geteuid() == 0
@@ -121,9 +213,13 @@ def main() -> str | None:
     )
 
     if not home_dir:
-        home_dir = (
-            f'/opt/{PROG}' if is_root else f'{platformdirs.user_data_dir()}/{PROG}'
-        )
+        if is_root:
+            home_dir = f'/opt/{PROG}'
+        else:
+            import platformdirs
+
+            home_dir = f'{platformdirs.user_data_dir()}/{PROG}'
+
     if not bin_dir:
         bin_dir = '/usr/local/bin' if is_root else '~/.local/bin'
     if not man_dir:
@@ -145,26 +241,12 @@ def main() -> str | None:
         print(man_path_check(f'{PROGU}_MAN_DIR', str(man_dir)))
         return None
 
-    # Ensure uv is installed/available
-    uv = args.uv or DEFUV
-    if not (verstr := run((uv, '--version'), capture=True, ignore_error=True)):
-        if args.uv:
-            return f'Error: specified uv "{uv}" program not found.'
-
-        return (
-            f'Error: {uv} program must be installed, and in your PATH '
-            'or specified with --uv option.'
-        )
-
-    uv_vers = verstr.split()[1]
-    if calc_version(uv_vers) < calc_version(MIN_UV_VERSION):
-        return (
-            f'Error: {uv} version is {uv_vers} but must be at least {MIN_UV_VERSION}.'
-        )
-
     # Keep some useful info in the namespace passed to the command
-    args._uv = uv
+    args._uv = args.uv or DEFUV
+    args._home_dir = home_dir
     args._lockfile = home_dir / f'.{PROG}.lock'
+    args._locks_dir = home_dir / 'locks'
+    args._journal_dir = home_dir / 'journal'
     args._packages_dir = home_dir / 'packages'
     args._packages_dir.mkdir(parents=True, exist_ok=True)
     args._venvs_dir = home_dir / 'venvs'
@@ -178,14 +260,48 @@ def main() -> str | None:
     args._prog = PROG
     args._meta_file = f'{PROG}_metadata.json'
     args._freeze_file = f'{PROG}_freeze.txt'
+    args._links_file = f'{PROG}_links.txt'
+    args._keep_generations = (
+        args.keep_generations
+        if args.keep_generations is not None
+        else int(os.getenv(f'{PROGU}_KEEP_GENERATIONS') or 0)
+    )
+    args._defer_compile = args.defer_compile or bool(
+        os.getenv(f'{PROGU}_DEFER_COMPILE')
+    )
     if not hasattr(args, 'verbose'):
         args.verbose = False
 
-    # Purge any old files left lying around
-    utils.purge_old_files(args)
+    if trace_file := args.trace or os.getenv(f'{PROGU}_TRACE'):
+        trace.enable()
+
+    try:
+        with trace.span(args.name, 'command'), profiling.cprofile(args.name):
+            return run_command(args)
+    finally:
+        if trace_file:
+            trace.write(str(utils.subenvars(trace_file)))
+
+
+def run_command(args: argparse.Namespace) -> str | None:
+    "Run the command that the user specified"
+    from . import trace, trash, utils
+
+    # Ensure uv is installed/available, if this command needs it
+    if args._uses_uv and (err := check_uv(args._uv, args._home_dir / '.uv_version')):
+        return err
+
+    # Clean up after any interrupted operations, and occasionally purge
+    # any other old files left lying around
+    with trace.span('purge', 'purge'):
+        utils.recover_journal(args)
+        utils.purge_old_files(args, interval=PURGE_INTERVAL)
 
-    # Run the command that the user specified
-    return args.func(args)
+    try:
+        return args.func(args)
+    finally:
+        # Delete anything the command removed in the background
+        trash.start_reaper(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,124 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Optional profiling of pipxu itself, enabled by an environment variable.
+
+Set PIPXU_PROFILE=cprofile to profile the command with cProfile and
+dump the stats to a .pstats file, or PIPXU_PROFILE=importtime to write
+an import time breakdown of the whole run. The output file can be set
+with PIPXU_PROFILE_FILE. Peak RSS is reported in both cases.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+PROG = Path(__file__).parent.name
+PROGU = PROG.upper()
+ENV_MODE = f'{PROGU}_PROFILE'
+ENV_FILE = f'{PROGU}_PROFILE_FILE'
+
+MODES = {'cprofile': 'pstats', 'importtime': 'importtime'}
+
+
+def get_mode() -> str | None:
+    "Return the profiling mode, if any"
+    return os.getenv(ENV_MODE) or None
+
+
+def check_mode(mode: str) -> str | None:
+    "Check the profiling mode is valid"
+    if mode not in MODES:
+        return f'Error: {ENV_MODE} must be one of: {", ".join(MODES)}.'
+
+    return None
+
+
+def _outfile(mode: str, name: str) -> str:
+    "Return the file to write the profile output to"
+    return os.getenv(ENV_FILE) or f'{PROG}-{name}-{os.getpid()}.{MODES[mode]}'
+
+
+def _report(outfile: str, *, rerun: bool = False) -> None:
+    "Report where the profile was written and the peak RSS"
+    import resource
+
+    # ru_maxrss is in KB on Linux but bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    crss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+    # If we re-ran ourself then that child did the actual work
+    if rerun:
+        rss = f'peak RSS {crss / 2**20:.1f} MB (incl. subprocesses)'
+    else:
+        srss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        rss = (
+            f'peak RSS {srss / 2**20:.1f} MB (largest subprocess {crss / 2**20:.1f} MB)'
+        )
+
+    print(f'{PROG}: profile written to "{outfile}", {rss}', file=sys.stderr)
+
+
+def importtime(name: str) -> int:
+    "Re-run ourself with import time tracing, returning its exit code"
+    import subprocess
+
+    outfile = _outfile('importtime', name)
+    env = {k: v for k, v in os.environ.items() if k != ENV_MODE}
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', PROG] + sys.argv[1:],
+        check=False,
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    # Separate the import times from any other error output
+    lines = res.stderr.splitlines(keepends=True)
+    with open(outfile, 'w') as fp:
+        fp.writelines(x for x in lines if x.startswith('import time:'))
+
+    sys.stderr.writelines(x for x in lines if not x.startswith('import time:'))
+    _report(outfile, rerun=True)
+    return res.returncode
+
+
+@contextmanager
+def cprofile(name: str) -> Iterator[None]:
+    "Profile the body with cProfile, if enabled"
+    if get_mode() != 'cprofile':
+        yield
+        return
+
+    import cProfile
+    import pstats
+    import threading
+
+    profs = [cProfile.Profile()]
+
+    # Commands run parallel jobs in threads so give each new thread its
+    # own profiler, which is merged with the others at the end. Newer
+    # pythons profile all threads with the one profiler and will not
+    # enable another.
+    def start(*_) -> None:
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return
+
+        profs.append(prof)
+
+    threading.setprofile(start)
+    profs[0].enable()
+    try:
+        yield
+    finally:
+        profs[0].disable()
+        threading.setprofile(None)
+        outfile = _outfile('cprofile', name)
+        pstats.Stats(*profs).dump_stats(outfile)
+        _report(outfile)
@@ -0,0 +1,121 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Central registry of installed packages.
+
+Caches the name, venv number, and JSON metadata of every installed
+package in a single file so that read-only commands do not have to open
+every venv's JSON file. The per-venv JSON files remain the source of
+truth and the registry is rebuilt from them whenever it is missing,
+corrupt, or the packages directory has changed behind its back.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from argparse import Namespace
+
+REGISTRY_FILE = 'registry.json'
+
+
+def _mtime(args: Namespace) -> int:
+    "Return modification time of the packages directory"
+    return args._packages_dir.stat().st_mtime_ns
+
+
+def _rebuild(args: Namespace, old: dict[str, dict] | None = None) -> dict[str, dict]:
+    "Rebuild the registry by scanning all packages and their JSON data"
+    from .utils import get_json
+
+    # Entries from the old registry are reused if the package link still
+    # points to the same venv, so only changed packages have to be read.
+    old = old or {}
+    pkgs = {}
+    for name in sorted(os.listdir(args._packages_dir)):
+        # Ignore any temporary link while it is being atomically replaced
+        if name.startswith('.'):
+            continue
+        try:
+            vname = os.path.basename(os.readlink(args._packages_dir / name))
+        except OSError:
+            continue
+        if not vname.isdigit():
+            continue
+        vnum = int(vname)
+        if (entry := old.get(name)) and entry['venv'] == vnum:
+            pkgs[name] = entry
+        elif data := get_json(args._venvs_dir / vname, args):
+            pkgs[name] = {'venv': vnum, 'data': data}
+
+    return pkgs
+
+
+def _read(args: Namespace) -> tuple[dict[str, dict] | None, bool]:
+    "Read the registry file, return packages and whether they are current"
+    try:
+        with (args._home_dir / REGISTRY_FILE).open() as fp:
+            reg = json.load(fp)
+    except (OSError, ValueError):
+        return None, False
+
+    return reg['packages'], reg.get('mtime') == _mtime(args)
+
+
+def _write(args: Namespace, pkgs: dict[str, dict], mtime: int) -> None:
+    "Atomically write the registry file"
+    from .utils import _write_text
+
+    _write_text(
+        args._home_dir / REGISTRY_FILE, json.dumps({'mtime': mtime, 'packages': pkgs})
+    )
+
+
+def _lock(args: Namespace):
+    "Return lock to protect updates to the registry"
+    from filelock import FileLock
+
+    return FileLock(args._home_dir / f'.{REGISTRY_FILE}.lock')
+
+
+def load(args: Namespace) -> dict[str, dict]:
+    "Return dict of all packages with their venv number and JSON data"
+    pkgs, current = _read(args)
+    if pkgs is not None and current:
+        return pkgs
+
+    with _lock(args):
+        pkgs, current = _read(args)
+        if pkgs is None or not current:
+            mtime = _mtime(args)
+            pkgs = _rebuild(args, pkgs)
+            _write(args, pkgs, mtime)
+
+    return pkgs
+
+
+def invalidate(args: Namespace) -> None:
+    "Remove the registry so it is fully rebuilt when next loaded"
+    with _lock(args):
+        (args._home_dir / REGISTRY_FILE).unlink(missing_ok=True)
+
+
+def update(args: Namespace, pkgname: str, vnum: int, data: dict) -> None:
+    "Add or update the given package in the registry"
+    with _lock(args):
+        mtime = _mtime(args)
+        pkgs, current = _read(args)
+        if pkgs is None or not current:
+            pkgs = _rebuild(args, pkgs)
+        pkgs[pkgname] = {'venv': vnum, 'data': data}
+        _write(args, dict(sorted(pkgs.items())), mtime)
+
+
+def remove(args: Namespace, pkgname: str) -> None:
+    "Remove the given package from the registry"
+    with _lock(args):
+        mtime = _mtime(args)
+        pkgs, current = _read(args)
+        if pkgs is None or not current:
+            pkgs = _rebuild(args, pkgs)
+        pkgs.pop(pkgname, None)
+        _write(args, pkgs, mtime)
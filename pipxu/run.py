@@ -3,10 +3,49 @@
 
 from __future__ import annotations
 
-import shlex
-import subprocess
+import io
 import sys
-from typing import Sequence
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Sequence, TextIO
+
+from . import trace
+
+# Per-thread output buffer, set when running parallel jobs
+_local = threading.local()
+
+
+class _ThreadStream:
+    "Stream wrapper which diverts writes to the current thread's buffer, if any"
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buf = getattr(_local, 'buffer', None)
+        return (self.stream if buf is None else buf).write(text)
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+def init_buffering() -> None:
+    "Enable per-thread buffering of stdout and stderr"
+    if not isinstance(sys.stdout, _ThreadStream):
+        sys.stdout = _ThreadStream(sys.stdout)
+    if not isinstance(sys.stderr, _ThreadStream):
+        sys.stderr = _ThreadStream(sys.stderr)
+
+
+@contextmanager
+def buffered() -> Iterator[io.StringIO]:
+    "Capture all output (incl. subprocess output) of this thread to a buffer"
+    _local.buffer = buf = io.StringIO()
+    try:
+        yield buf
+    finally:
+        _local.buffer = None
 
 
 def run(
@@ -15,28 +54,54 @@ def run(
     capture: bool = False,
     quiet: bool = False,
     ignore_error=False,
+    merge: bool = False,
 ) -> str | None:
     "Run given command"
+    import shlex
+    import subprocess
+
     # Lazy evaluation of cmdstr
     cmdstr = None
 
+    # If this thread is buffering then we must also capture the output
+    # of the subprocess
+    buf = getattr(_local, 'buffer', None)
+    stderr = None
+
     if capture:
         stdout = subprocess.PIPE
+        if merge:
+            stderr = subprocess.STDOUT
+        elif buf is not None:
+            stderr = subprocess.PIPE
     else:
         stdout = None
+        if buf is not None:
+            stdout = subprocess.PIPE
+            stderr = subprocess.STDOUT
         if not quiet:
             if not cmdstr:
                 cmdstr = shlex.join(cmd)
             print(f'>>> Running {cmdstr}')
+    start = trace.now()
     try:
-        res = subprocess.run(cmd, stdout=stdout, text=True)
+        res = subprocess.run(cmd, stdout=stdout, stderr=stderr, text=True)
     except Exception as e:
+        trace.add_run(cmd, start, None)
         if not ignore_error:
             if not cmdstr:
                 cmdstr = shlex.join(cmd)
             print(f'{cmdstr} failed: {e}', file=sys.stderr)
         return None
 
+    trace.add_run(cmd, start, res.returncode)
+
+    if buf is not None:
+        if res.stderr:
+            buf.write(res.stderr)
+        if not capture and res.stdout:
+            buf.write(res.stdout)
+
     if res.returncode != 0:
         return None
 
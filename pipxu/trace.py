@@ -0,0 +1,130 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Optional timing trace of subprocess runs and other phases.
+
+When enabled, each run() of a subprocess and each explicit span() is
+recorded with its start, duration, package, and phase, and written as
+Chrome trace event JSON which can be loaded into chrome://tracing or
+https://ui.perfetto.dev. Parallel jobs appear as separate threads.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+# Recorded events, or None when tracing is not enabled
+_events: list[dict] | None = None
+_threads: dict[int, str] = {}
+_lock = threading.Lock()
+
+# Per-thread package and phase context
+_local = threading.local()
+
+
+def enable() -> None:
+    "Enable tracing"
+    global _events
+    _events = []
+
+
+def enabled() -> bool:
+    "Return True if tracing is enabled"
+    return _events is not None
+
+
+def now() -> float:
+    "Return the current time in microseconds"
+    return time.perf_counter_ns() / 1000
+
+
+@contextmanager
+def context(*, package: str | None = None, phase: str | None = None) -> Iterator[None]:
+    "Set the package and/or phase for anything traced in this thread"
+    old = getattr(_local, 'package', None), getattr(_local, 'phase', None)
+    if package is not None:
+        _local.package = package
+    if phase is not None:
+        _local.phase = phase
+    try:
+        yield
+    finally:
+        _local.package, _local.phase = old
+
+
+def _add(name: str, start: float, **args) -> None:
+    "Record a completed event which began at the given start time"
+    if _events is None:
+        return
+
+    end = now()
+    if package := getattr(_local, 'package', None):
+        args['package'] = package
+    args.setdefault('phase', getattr(_local, 'phase', None) or 'other')
+    thread = threading.current_thread()
+    event = {
+        'name': name,
+        'cat': args['phase'],
+        'ph': 'X',
+        'ts': start,
+        'dur': end - start,
+        'pid': os.getpid(),
+        'tid': thread.native_id,
+        'args': args,
+    }
+    with _lock:
+        _events.append(event)
+        _threads[thread.native_id] = thread.name
+
+
+def add_run(cmd: Sequence[str], start: float, returncode: int | None) -> None:
+    "Record a subprocess run"
+    if _events is None:
+        return
+
+    # Infer the phase from the uv command, if not set by the caller
+    phase = None
+    if not getattr(_local, 'phase', None) and len(cmd) > 1:
+        phase = 'venv' if cmd[1] == 'venv' else cmd[2] if cmd[1] == 'pip' else None
+
+    name = ' '.join(os.path.basename(c) if i == 0 else c for i, c in enumerate(cmd[:3]))
+    args = {'cmd': list(cmd), 'returncode': returncode}
+    if phase:
+        args['phase'] = phase
+    _add(name, start, **args)
+
+
+@contextmanager
+def span(name: str, phase: str | None = None) -> Iterator[None]:
+    "Record the time spent in the body as an event"
+    if _events is None:
+        yield
+        return
+
+    start = now()
+    try:
+        yield
+    finally:
+        if phase:
+            _add(name, start, phase=phase)
+        else:
+            _add(name, start)
+
+
+def write(path: str) -> None:
+    "Write the recorded events to the given file"
+    if _events is None:
+        return
+
+    pid = os.getpid()
+    meta = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': t, 'args': {'name': n}}
+        for t, n in _threads.items()
+    ]
+
+    with open(path, 'w') as fp:
+        json.dump({'traceEvents': meta + _events, 'displayTimeUnit': 'ms'}, fp)
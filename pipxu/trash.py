@@ -0,0 +1,95 @@
+# Author: Mark Blakeney, Feb 2024.
+"""
+Deferred deletion of removed directories.
+
+Deleting a large venv can take a long time so directories to be removed
+are instead atomically renamed into PIPXU_HOME/trash/, which is
+instant, and then deleted by a detached background reaper process
+started when the command finishes. Anything left in the trash (e.g. if
+a reaper was killed) is deleted by the next reaper, or by the gc
+command.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from argparse import Namespace
+from pathlib import Path
+
+TRASH_DIR = 'trash'
+
+
+def _trash_dir(home_dir: Path) -> Path:
+    "Return the trash directory"
+    return home_dir / TRASH_DIR
+
+
+def move(args: Namespace, path: Path) -> None:
+    "Move the directory to the trash, or just delete it if we can not"
+    import shutil
+    import tempfile
+
+    tdir = _trash_dir(args._home_dir)
+    try:
+        tdir.mkdir(exist_ok=True)
+        # Atomically replace a new unique empty dir with the given dir
+        os.replace(path, tempfile.mkdtemp(prefix=f'{path.name}.', dir=tdir))
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def is_empty(args: Namespace) -> bool:
+    "Return True if there is nothing in the trash"
+    try:
+        return not any(_trash_dir(args._home_dir).iterdir())
+    except OSError:
+        return True
+
+
+def empty(home_dir: Path, jobs: int | None = None) -> None:
+    "Delete everything in the trash, in parallel"
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+
+    from filelock import FileLock
+
+    tdir = _trash_dir(home_dir)
+
+    # Only one reaper at a time, any others wait and then delete whatever
+    # has been added since
+    with FileLock(home_dir / f'.{TRASH_DIR}.lock'):
+        if not tdir.is_dir() or not (paths := list(tdir.iterdir())):
+            return
+
+        def delete(path: Path) -> None:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as ex:
+            list(ex.map(delete, paths))
+
+
+def start_reaper(args: Namespace) -> None:
+    "Start a detached background process to empty the trash, if needed"
+    if is_empty(args):
+        return
+
+    import subprocess
+
+    try:
+        subprocess.Popen(
+            [sys.executable, '-m', __name__, str(args._home_dir)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        empty(args._home_dir)
+
+
+if __name__ == '__main__':
+    empty(Path(sys.argv[1]))
@@ -5,16 +5,25 @@ from __future__ import annotations
 
 import json
 import os
-import shutil
+import re
 import sys
+import threading
 from argparse import Namespace
-from collections.abc import Iterable, Sequence
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import unquote, urlparse
 
-from .run import run
+from . import registry, trace, trash
+from .run import buffered, init_buffering, run
 
 HOME = Path.home()
 
+VENV_COUNTER = '.venv_counter'
+
+# File in venv site-packages which adds a shared layer to the path
+LAYER_PTH = '_pipxu_layer.pth'
+
 
 def subenvars(path: str, *, resolve: bool = False) -> Path:
     "Substitute environment variables in a path string"
@@ -42,12 +51,24 @@ def get_json(vdir: Path, args: Namespace) -> dict | None:
         return None
 
 
+def _write_text(tgt: Path, text: str) -> None:
+    "Atomically write text to a file, i.e. as a new file"
+    # Writing a new file (rather than in place) also ensures we never
+    # modify a file shared by hard link with a retained venv generation.
+    tmp = tgt.with_name(f'.{tgt.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+    try:
+        tmp.write_text(text)
+        os.replace(tmp, tgt)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
 def _set_json(vdir: Path, args: Namespace, data: dict) -> str | None:
     "Set JSON data for this virtual environment"
     tgt = vdir.resolve() / args._meta_file
     try:
-        with tgt.open('w') as fp:
-            json.dump(data, fp)
+        _write_text(tgt, json.dumps(data))
     except Exception as e:
         return str(e)
 
@@ -62,28 +83,150 @@ def piprun(vdir: Path, args: Namespace, cmd: list[str], **kargs) -> str | None:
     return run([args._uv, 'pip'] + cmd, **kargs)
 
 
-def get_versions(
-    vdir: Path, args: Namespace
-) -> dict[str, tuple[str, str | None]] | None:
-    "Return the versions of the packages in the virtual environment"
-    if not (out := piprun(vdir, args, ['list', '-q'], capture=True)):
+def normalize_name(name: str) -> str:
+    "Return normalized form of given package name"
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def site_packages(vdir: Path) -> list[Path]:
+    "Return the site-packages directories of the virtual environment"
+    # E.g. lib/python3.12/site-packages, or lib/pypy3.10/site-packages
+    return sorted(vdir.glob('lib/*/site-packages'))
+
+
+def layer_pth_line(sdir: Path) -> str:
+    "Return the layer .pth file line which adds the given site-packages dir"
+    # Use site.addsitedir() rather than just the path so that any .pth
+    # files in the layer (e.g. namespace packages) are also processed
+    return f'import site; site.addsitedir({str(sdir)!r})\n'
+
+
+def layer_site_packages(vdir: Path) -> list[Path]:
+    "Return the site-packages directories of any layer used by the venv"
+    import ast
+
+    sdirs = []
+    for sdir in site_packages(vdir):
+        try:
+            lines = (sdir / LAYER_PTH).read_text().splitlines()
+        except OSError:
+            continue
+
+        for line in lines:
+            if m := re.search(r'site\.addsitedir\((.+)\)', line):
+                sdirs.append(Path(ast.literal_eval(m.group(1))))
+
+    return sdirs
+
+
+def _read_metadata(ddir: Path) -> tuple[str, str] | None:
+    "Return the name and version from a dist-info METADATA file"
+    name = version = None
+    try:
+        with (ddir / 'METADATA').open(encoding='utf-8') as fp:
+            # Only need to read the headers at the top of the file
+            for line in fp:
+                if not (line := line.rstrip('\n')):
+                    break
+                if line.startswith('Name:'):
+                    name = line[5:].strip()
+                elif line.startswith('Version:'):
+                    version = line[8:].strip()
+    except (OSError, ValueError):
         return None
 
-    found = False
+    return (name, version) if name and version else None
+
+
+def _read_direct_url(ddir: Path) -> dict | None:
+    "Return the contents of a dist-info direct_url.json file, if any"
+    try:
+        with (ddir / 'direct_url.json').open() as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _dist_infos(vdir: Path, pkgname: str | None = None) -> Iterable[Path]:
+    "Yield the dist-info dirs of all packages (or just pkgname) in the venv"
+    key = pkgname and normalize_name(pkgname)
+
+    # Packages in the venv itself take precedence over any in its layer
+    seen = set()
+    for sdir in site_packages(vdir) + layer_site_packages(vdir):
+        for ddir in sdir.glob('*.dist-info'):
+            name = normalize_name(ddir.name.split('-', 1)[0])
+            if (not key or name == key) and name not in seen:
+                seen.add(name)
+                yield ddir
+
+
+def get_dists(vdir: Path, pkgname: str | None = None) -> Iterable[tuple]:
+    "Yield (name, version, direct_url) for each package in the virtual environment"
+    for ddir in _dist_infos(vdir.resolve(), pkgname):
+        if namever := _read_metadata(ddir):
+            yield normalize_name(namever[0]), namever[1], _read_direct_url(ddir)
+
+
+def get_versions(
+    vdir: Path, pkgname: str | None = None
+) -> dict[str, tuple[str, str | None]]:
+    "Return the versions of the packages (or just pkgname) in the virtual environment"
     data: dict[str, tuple[str, str | None]] = {}
-    for line in out.splitlines():
-        if line.startswith('-'):
-            found = True
-        elif found:
-            fields = line.split(maxsplit=2)
-            if len(fields) == 2:
-                data[fields[0]] = fields[1], None
-            else:
-                data[fields[0]] = fields[1], fields[2]
+    for name, version, direct_url in sorted(
+        get_dists(vdir, pkgname), key=lambda d: d[0]
+    ):
+        loc = None
+        if direct_url and direct_url.get('dir_info', {}).get('editable'):
+            loc = unquote(urlparse(direct_url['url']).path)
+        data[name] = version, loc
 
     return data
 
 
+def _direct_url(direct_url: dict) -> str:
+    "Return the requirement URL for given direct_url.json contents"
+    url = direct_url['url']
+    if vcs := direct_url.get('vcs_info'):
+        url = f'{vcs["vcs"]}+{url}'
+        if rev := vcs.get('commit_id') or vcs.get('requested_revision'):
+            url += f'@{rev}'
+
+    if subdir := direct_url.get('subdirectory'):
+        url += f'#subdirectory={subdir}'
+
+    return url
+
+
+def freeze(vdir: Path) -> str:
+    "Return the freeze list for the virtual environment, same as uv pip freeze"
+    lines = []
+    for name, version, direct_url in sorted(get_dists(vdir), key=lambda d: d[:2]):
+        if not direct_url:
+            lines.append(f'{name}=={version}')
+        elif direct_url.get('dir_info', {}).get('editable'):
+            lines.append(f'-e {_direct_url(direct_url)}')
+        else:
+            lines.append(f'{name} @ {_direct_url(direct_url)}')
+
+    return '\n'.join(lines)
+
+
+def installed_version(vdir: Path, pkgname: str, args: Namespace) -> str | None:
+    "Return the installed version of the package from the stored freeze list"
+    try:
+        lines = (vdir / args._freeze_file).read_text().splitlines()
+    except OSError:
+        lines = freeze(vdir).splitlines()
+
+    prefix = f'{pkgname}=='
+    for line in lines:
+        if line.startswith(prefix):
+            return line[len(prefix) :]
+
+    return None
+
+
 def make_args(*args: Sequence) -> list[str]:
     "Build a list of args based on (bool, arg1, [arg2]) sequences"
     retlist: list[str] = []
@@ -94,13 +237,43 @@ def make_args(*args: Sequence) -> list[str]:
     return retlist
 
 
+def compile_args(args: Namespace) -> list[str]:
+    "Return uv pip args to compile bytecode, unless compiling is deferred"
+    return [] if args._defer_compile else ['--compile-bytecode']
+
+
+def bundle_args(bundle: str | None) -> list[str]:
+    "Return uv pip args to install only from the given bundle directory"
+    if not bundle:
+        return []
+
+    return ['--offline', '--no-index', '--find-links', str(subenvars(bundle))]
+
+
 def vdir_bin(vdir: Path) -> Path:
     "Return the bin directory for the virtual environment"
     return vdir / 'bin'
 
 
+def symlink(srcfile: Path, tgtfile: Path) -> None:
+    "Atomically create or replace tgtfile as a symlink to srcfile"
+    tmpfile = tgtfile.with_name(
+        f'.{tgtfile.name}.{os.getpid()}-{threading.get_ident()}.tmp'
+    )
+    tmpfile.unlink(missing_ok=True)
+    tmpfile.symlink_to(srcfile)
+    try:
+        os.replace(tmpfile, tgtfile)
+    except Exception:
+        tmpfile.unlink()
+        raise
+
+
 def _load_record(rfile: Path) -> Iterable[str]:
     "Yield the executable names from a RECORD file"
+    if not rfile.is_file():
+        return
+
     with rfile.open() as fp:
         for line in fp:
             line = line.strip()
@@ -108,58 +281,52 @@ def _load_record(rfile: Path) -> Iterable[str]:
                 yield Path(line.split(',', 1)[0]).name
 
 
-def _link_app_files(
-    vdir: Path, tgtdir: Path, pkgname: str, args: Namespace, include_deps: bool
-) -> Iterable[str]:
-    "Link app files from entry_points to tgtdir"
+def _get_app_files(vdir: Path, pkgname: str, include_deps: bool) -> Iterable[Path]:
+    "Yield the app files from the package entry_points"
     vpath = vdir_bin(vdir)
 
-    key = pkgname.replace('-', '_').lower() + '-'
-    for efile in vdir.glob('**/*.dist-info/RECORD'):
-        if include_deps or efile.parent.name.lower().startswith(key):
-            for app in _load_record(efile):
-                srcfile = vpath / app
-                if (
-                    srcfile.is_file()
-                    and not srcfile.is_symlink()
-                    and (srcfile.stat().st_mode & 0o111) == 0o111
-                ):
-                    tgtfile = tgtdir / app
-                    if tgtfile.is_symlink():
-                        tgtfile.unlink()
-
-                    if args.verbose:
-                        print(f'Linking "{srcfile}" -> "{tgtfile}"')
-
-                    tgtfile.parent.mkdir(parents=True, exist_ok=True)
-                    try:
-                        tgtfile.symlink_to(srcfile)
-                    except Exception as e:
-                        print(f'Error: {e}', file=sys.stderr)
-                        return
-
-                    yield srcfile.name
-
-
-def _link_all_files(srcdir: Path, tgtdir: Path, pat: str, verbose: bool) -> None:
-    "Link files from srcdir to tgtdir"
-    for srcfile in srcdir.glob(pat):
-        tgtfile = tgtdir / srcfile.relative_to(srcdir)
+    # Only need to read the RECORD of the package itself, unless we are
+    # also including the executables of its dependencies. Executables of
+    # dependencies in a shared layer are not linked since the layer is
+    # not owned by this venv.
+    for ddir in _dist_infos(vdir, None if include_deps else pkgname):
+        if vdir not in ddir.parents:
+            continue
+        for app in _load_record(ddir / 'RECORD'):
+            srcfile = vpath / app
+            if (
+                srcfile.is_file()
+                and not srcfile.is_symlink()
+                and (srcfile.stat().st_mode & 0o111) == 0o111
+            ):
+                yield srcfile
+
+
+def _link_files(links: dict[Path, Path], args: Namespace) -> Iterable[Path]:
+    "Create or replace links (tgtfile -> srcfile), only where changed"
+    for tgtfile, srcfile in links.items():
         if tgtfile.is_symlink():
-            tgtfile.unlink()
+            if Path(os.readlink(tgtfile)) == srcfile:
+                yield tgtfile
+                continue
+        elif tgtfile.exists():
+            print(f'Error: "{tgtfile}" exists and is not a link.', file=sys.stderr)
+            continue
 
-        if verbose:
+        if args.verbose:
             print(f'Linking "{srcfile}" -> "{tgtfile}"')
 
         tgtfile.parent.mkdir(parents=True, exist_ok=True)
         try:
-            tgtfile.symlink_to(srcfile)
+            symlink(srcfile, tgtfile)
         except Exception as e:
             print(f'Error: {e}', file=sys.stderr)
+        else:
+            yield tgtfile
 
 
-def _unlink_all_files(vdir: Path, args: Namespace) -> None:
-    "Unlink all link files"
+def _scan_links(vdir: Path, args: Namespace) -> Iterable[Path]:
+    "Scan the bin and man dirs for all links pointing into the venv"
     dirlist: list[tuple[Path, str]] = [(args._bin_dir, '*')]
     if args._man_dir.is_dir():
         dirlist.append((args._man_dir, '*/*'))
@@ -168,9 +335,35 @@ def _unlink_all_files(vdir: Path, args: Namespace) -> None:
         if srcdir.is_dir():
             for file in srcdir.glob(pat):
                 if file.is_symlink() and vdir in file.resolve().parents:
-                    if args.verbose:
-                        print(f'Removing link "{file}"')
-                    file.unlink()
+                    yield file
+
+
+def _get_links(vdir: Path, args: Namespace) -> list[Path]:
+    "Return the links recorded as created for this venv"
+    try:
+        text = (vdir / args._links_file).read_text()
+    except OSError:
+        # A venv which has never been linked has no links. Otherwise there
+        # is no record (i.e. old venv) so fall back to scanning for them.
+        if not (vdir / args._meta_file).exists():
+            return []
+        return list(_scan_links(vdir, args))
+
+    return [Path(f) for f in text.splitlines()]
+
+
+def _unlink_files(files: Iterable[Path], vdir: Path, args: Namespace) -> int:
+    "Unlink given link files, return number removed"
+    count = 0
+    for file in files:
+        # Only remove the link if it still points into this venv
+        if file.is_symlink() and vdir in Path(os.readlink(file)).parents:
+            if args.verbose:
+                print(f'Removing link "{file}"')
+            file.unlink()
+            count += 1
+
+    return count
 
 
 def make_links(
@@ -180,10 +373,6 @@ def make_links(
 
     vdir = vdir.resolve()
 
-    # Unlink any existing links
-    _unlink_all_files(vdir, args)
-
-    # Link the package applications
     if not data and not (data := get_json(vdir, args)):
         return 'Error: No JSON data found.'
 
@@ -191,35 +380,197 @@ def make_links(
         args.include_deps if hasattr(args, 'include_deps') else data.get('deps')
     )
 
-    apps = list(_link_app_files(vdir, args._bin_dir, pkgname, args, include_deps))
+    with trace.span('make links', 'link'):
+        # Work out the set of links we want for the package applications
+        # and man pages
+        wanted = {
+            args._bin_dir / f.name: f
+            for f in _get_app_files(vdir, pkgname, include_deps)
+        }
 
-    # Link all the man pages
-    if not args.no_man_pages:
-        _link_all_files(vdir / 'share' / 'man', args._man_dir, '*/*', args.verbose)
+        if not args.no_man_pages:
+            mandir = vdir / 'share' / 'man'
+            for srcfile in mandir.glob('*/*'):
+                wanted[args._man_dir / srcfile.relative_to(mandir)] = srcfile
+
+        # Only change the links which differ from what we have now. New and
+        # changed links are atomically replaced so the apps never disappear.
+        existing = _get_links(vdir, args)
+        links = list(_link_files(wanted, args))
+        _unlink_files((f for f in existing if f not in wanted), vdir, args)
+
+        # Record the links we created so we can remove them later
+        _write_text(vdir / args._links_file, ''.join(f'{f}\n' for f in links))
 
     # Save the apps in the JSON data
-    if not apps:
+    if not (apps := [f.name for f in links if f.parent == args._bin_dir]):
         return f'Error: {pkgname} has no executables to install.'
 
-    if not (freeze := piprun(vdir, args, ['freeze'], capture=True)):
+    with trace.span('freeze', 'freeze'):
+        freezelist = freeze(vdir)
+
+    if not freezelist:
         return 'Error: Failed to fetch freeze list.'
 
-    (vdir / args._freeze_file).write_text(freeze)
+    _write_text(vdir / args._freeze_file, freezelist)
+
+    if args._defer_compile:
+        from . import bytecode
+
+        bytecode.queue(args, vdir)
+
+    # Record changed venvs if the command wants to know them
+    if (changed := getattr(args, '_changed_vdirs', None)) is not None:
+        changed.append(vdir)
+
     data['apps'] = sorted(apps)
-    return _set_json(vdir, args, data)
+    if err := _set_json(vdir, args, data):
+        return err
 
+    registry.update(args, pkgname, int(vdir.name), data)
+    return None
 
-def rm_vdir(vdir: Path, args: Namespace) -> None:
+
+def unlink_vdir(vdir: Path, args: Namespace) -> int:
     "Remove all links that point into the virtual environment"
     vdir = vdir.resolve()
-    _unlink_all_files(vdir, args)
+    return _unlink_files(_get_links(vdir, args), vdir, args)
+
+
+def rm_vdir(vdir: Path, args: Namespace) -> None:
+    "Remove the virtual environment and all links that point into it"
+    vdir = vdir.resolve()
+    unlink_vdir(vdir, args)
 
-    # Remove the venv
+    # Remove the venv. It is moved to the trash so this is instant.
     if vdir.exists():
         if args.verbose:
             print(f'Removing "{vdir}"')
 
-        shutil.rmtree(vdir)
+        trash.move(args, vdir)
+
+
+def _add_journal(args: Namespace, vdir: Path) -> Path:
+    "Add journal entry for an operation on vdir"
+    args._journal_dir.mkdir(exist_ok=True)
+    jfile = args._journal_dir / f'{os.getpid()}-{vdir.name}'
+    _write_text(jfile, str(vdir))
+    return jfile
+
+
+@contextmanager
+def journal(args: Namespace, vdir: Path) -> Iterator[None]:
+    "Journal an operation on vdir so it is removed if we are interrupted"
+    jfile = _add_journal(args, vdir)
+
+    # Note we deliberately do not remove the journal entry if an
+    # exception occurs, so that the venv is cleaned up on the next run.
+    yield
+    jfile.unlink()
+
+
+def _next_vdir_num(args: Namespace) -> int:
+    "Return the next venv number to try, from our saved counter"
+    try:
+        return int((args._home_dir / VENV_COUNTER).read_text())
+    except (OSError, ValueError):
+        pass
+
+    # Counter is missing or corrupt so start after the highest existing
+    # venv. This is only ever done once.
+    nums = [int(f.name) for f in args._venvs_dir.iterdir() if f.name.isdigit()]
+    return max(nums, default=0) + 1
+
+
+def _alloc_vdir(args: Namespace) -> Path:
+    "Create and return a new uniquely numbered venv directory"
+    num = _next_vdir_num(args)
+
+    # The counter is only a hint, mkdir() is what atomically claims the dir
+    while True:
+        vdir = args._venvs_dir / str(num)
+        try:
+            vdir.mkdir()
+        except FileExistsError:
+            num += 1
+        else:
+            break
+
+    _write_text(args._home_dir / VENV_COUNTER, f'{num + 1}\n')
+    return vdir
+
+
+@contextmanager
+def new_vdir(args: Namespace) -> Iterator[Path]:
+    "Create a new venv directory, journaled while we operate on it"
+    from filelock import FileLock
+
+    # Hold the lock only so a concurrent purge can not remove the new
+    # dir before it is journaled. Allocation cost is independent of the
+    # number of venvs so the lock is held only momentarily.
+    with FileLock(args._lockfile):
+        vdir = _alloc_vdir(args)
+        jfile = _add_journal(args, vdir)
+
+    # Note we deliberately do not remove the journal entry if an
+    # exception occurs, so that the venv is cleaned up on the next run.
+    yield vdir
+    jfile.unlink()
+
+
+def _pid_alive(pid: int) -> bool:
+    "Return True if the given process is running"
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+
+    return True
+
+
+def get_journal(args: Namespace) -> Iterable[tuple[Path, Path, bool]]:
+    "Yield each journal file, its venv, and whether its process is alive"
+    if args._journal_dir.is_dir():
+        for jfile in args._journal_dir.iterdir():
+            # Ignore temporary files being written
+            if jfile.name.startswith('.'):
+                continue
+
+            # The entry may be removed by its process as we read it
+            try:
+                path = jfile.read_text().strip()
+            except OSError:
+                continue
+
+            pid = jfile.name.split('-', 1)[0]
+            alive = pid.isdigit() and _pid_alive(int(pid))
+            yield jfile, Path(path), alive
+
+
+def recover_journal(args: Namespace) -> None:
+    "Clean up any venvs left behind by interrupted operations"
+    if not any(not alive for _, _, alive in get_journal(args)):
+        return
+
+    from filelock import FileLock
+
+    with FileLock(args._lockfile):
+        for jfile, vdir, alive in get_journal(args):
+            if alive:
+                continue
+
+            print(f'Purging interrupted "{vdir}"', file=sys.stderr)
+            for pkg in args._packages_dir.iterdir():
+                if pkg.is_symlink() and Path(os.readlink(pkg)) == vdir:
+                    pkg.unlink()
+
+            rm_vdir(vdir, args)
+            jfile.unlink(missing_ok=True)
+
+        # The registry may refer to a venv we removed so force a rebuild
+        registry.invalidate(args)
 
 
 def _pkg_merge(inset: list[str], changeset: list[str], add: bool) -> Iterable[str]:
@@ -274,19 +625,29 @@ def rm_package(pkgname: str, args: Namespace) -> bool:
 
     vdir = pdir.resolve()
 
-    if args.verbose:
-        print(f'Removing link "{pdir}"')
-    pdir.unlink()
+    with journal(args, vdir):
+        if args.verbose:
+            print(f'Removing link "{pdir}"')
+        pdir.unlink()
+        registry.remove(args, pkgname)
+
+        rm_vdir(vdir, args)
 
-    rm_vdir(vdir, args)
     return True
 
 
-def get_all_pkg_venvs(args: Namespace) -> Iterable[tuple[Path, dict]]:
-    "Return a list of all virtual environments and their JSON data"
-    for pdir in sorted(args._packages_dir.iterdir()):
-        if data := get_json(pdir, args):
-            yield pdir, data
+def pkg_lock(pkgname: str, args: Namespace):
+    "Return a lock file for exclusive operations on the given package"
+    from filelock import FileLock
+
+    args._locks_dir.mkdir(exist_ok=True)
+    return FileLock(args._locks_dir / f'{pkgname}.lock')
+
+
+def get_all_pkg_venvs(args: Namespace) -> Iterable[tuple[str, Path, dict]]:
+    "Return a list of all packages, their virtual environments and JSON data"
+    for pkgname, entry in registry.load(args).items():
+        yield pkgname, args._venvs_dir / str(entry['venv']), entry['data']
 
 
 def _get_package_if_dir(name: str, args: Namespace) -> str | None:
@@ -302,20 +663,25 @@ def _get_package_if_dir(name: str, args: Namespace) -> str | None:
     # application editpaths, unless we find an exact match then just
     # use that.
     candidates = {}
-    for pdir, data in get_all_pkg_venvs(args):
+    for pkgname, _, data in get_all_pkg_venvs(args):
         if data and (path := data.get('editpath')):
             # If we have an exact match then use it and ignore any
             # previous candidates.
             if (path := Path(path).expanduser()) == namepath:
-                return pdir.name
+                return pkgname
 
             if path in namepath.parents:
                 # This path has a candidate parent, so record it.
-                candidates[len(path.parts)] = pdir.name
+                candidates[len(path.parts)] = pkgname
 
     return candidates[max(candidates)] if candidates else None
 
 
+def get_package_name(name: str, args: Namespace) -> str:
+    "Return the package name corresponding to the given arg"
+    return _get_package_if_dir(name, args) or name
+
+
 def get_package_from_arg(name: str, args: Namespace) -> tuple[str, Path | None]:
     "Return the package name + vdir corresponding to the given arg, if any"
     if not (pkg := _get_package_if_dir(name, args)):
@@ -325,42 +691,85 @@ def get_package_from_arg(name: str, args: Namespace) -> tuple[str, Path | None]:
     return pkg, (vdir if vdir.exists() else None)
 
 
-def _rm_path(path: Path) -> None:
+def _rm_path(path: Path, args: Namespace) -> None:
     "Remove the given path"
     print(f'Purging stray "{path}"', file=sys.stderr)
     if path.is_symlink():
         path.unlink()
     elif path.is_dir():
-        shutil.rmtree(path)
+        trash.move(args, path)
     elif path.exists():
         path.unlink()
 
 
-def purge_old_files(args: Namespace) -> None:
+def purge_old_files(args: Namespace, *, interval: float | None = None) -> None:
     "Clean out any old virtual environments, packages, and executables"
+    import time
+
+    # If an interval is given then only purge if we have not done so
+    # within that time
+    stamp = args._home_dir / '.last_purge'
+    if interval is not None:
+        try:
+            if time.time() - stamp.stat().st_mtime < interval:
+                return
+        except FileNotFoundError:
+            pass
+
+    from filelock import FileLock
+
+    with FileLock(args._lockfile):
+        stamp.touch()
+        _purge_old_files(args)
+
+
+def _purge_old_files(args: Namespace) -> None:
+    "Clean out any old virtual environments, packages, and executables"
+    # Ignore venvs which are being operated on by running processes
+    valids_venvs = {v.name for _, v, alive in get_journal(args) if alive}
+
     # Remove any packages that do not point to a dir in the venvs directory
-    valids_venvs = set()
     for pkg in args._packages_dir.iterdir():
         vdir = pkg.resolve()
         if (
-            vdir.parent != args._venvs_dir
+            pkg.name.startswith('.')
+            or vdir.parent != args._venvs_dir
             or not vdir.is_dir()
             or not vdir.name.isdigit()
         ):
-            _rm_path(pkg)
+            _rm_path(pkg, args)
+        else:
+            valids_venvs.add(vdir.name)
+
+    # Retained generations of installed packages are also valid venvs
+    from . import generations
+
+    for pkgname, link in generations.get_all(args):
+        vdir = link.resolve()
+        if (
+            not (args._packages_dir / pkgname).is_symlink()
+            or vdir.parent != args._venvs_dir
+            or not vdir.is_dir()
+        ):
+            _rm_path(link, args)
         else:
             valids_venvs.add(vdir.name)
 
     # Remove any venvs that are not in the packages directory
     for vdir in args._venvs_dir.iterdir():
         if vdir.name not in valids_venvs:
-            _rm_path(vdir)
+            _rm_path(vdir, args)
+
+    # Remove any shared layers no longer used by any venv
+    from . import layers
+
+    layers.purge(args, [args._venvs_dir / v for v in valids_venvs])
 
     # Remove any executables that point to a non-existent path
     for exe in args._bin_dir.iterdir():
         rexe = exe.resolve()
         if args._venvs_dir in rexe.parents and not rexe.exists():
-            _rm_path(exe)
+            _rm_path(exe, args)
 
 
 def get_package_names(args: Namespace) -> list[str]:
@@ -377,8 +786,8 @@ def get_package_names(args: Namespace) -> list[str]:
         if not args.package:
             args.parser.error('Must specify at least one package, or --all.')
 
-    given_names = set((_get_package_if_dir(p, args) or p) for p in args.package)
-    all_names = set(f.name for f in args._packages_dir.iterdir() if f.is_dir())
+    given_names = {get_package_name(p, args) for p in args.package}
+    all_names = set(registry.load(args))
 
     if unknown := given_names - all_names:
         s = 's' if len(unknown) > 1 else ''
@@ -387,6 +796,57 @@ def get_package_names(args: Namespace) -> list[str]:
     return sorted(all_names - given_names) if args.all else args.package
 
 
+def positive_int(value: str) -> int:
+    "Argparse type for a count which must be at least 1"
+    from argparse import ArgumentTypeError
+
+    try:
+        num = int(value)
+    except ValueError:
+        num = 0
+
+    if num < 1:
+        raise ArgumentTypeError(f'must be a positive integer: "{value}"')
+
+    return num
+
+
+def run_jobs(
+    func: Callable[[str], str | None], names: Sequence[str], jobs: int | None
+) -> str | None:
+    "Run func() for each name using a pool of parallel jobs, report any errors"
+    if len(names) == 1:
+        with trace.context(package=names[0]):
+            return func(names[0])
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    init_buffering()
+    lock = threading.Lock()
+
+    def job(name: str) -> str | None:
+        # Buffer all output for this job and then print it as one block
+        with buffered() as buf, trace.context(package=name):
+            try:
+                err = func(name)
+            except (OSError, ValueError) as e:
+                err = f'Error: {name}: {e}'
+            if err:
+                print(err, file=sys.stderr)
+        with lock:
+            print(buf.getvalue(), end='', flush=True)
+        return err
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as ex:
+        errors = {n: e for n, e in zip(names, ex.map(job, names)) if e}
+
+    if not errors:
+        return None
+
+    lines = '\n'.join(f'  {n}: {e}' for n, e in errors.items())
+    return f'Error: {len(errors)} of {len(names)} applications failed:\n{lines}'
+
+
 def get_python(args: Namespace) -> Path:
     "Return the python executable based on command line args"
     return subenvars(args.python) if args.python else args._pyexe
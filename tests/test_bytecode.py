@@ -0,0 +1,78 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for deferred bytecode compilation."
+
+from __future__ import annotations
+
+import py_compile
+from pathlib import Path
+
+import pytest
+
+from pipxu import bytecode
+
+# The compileall args we always pass
+COMPILEALL = ['-m', 'compileall', '--invalidation-mode', 'timestamp']
+
+
+def _sdir(version: str) -> Path:
+    "Return the site-packages dir of a venv for the given python version"
+    return Path('/venvs/1/lib', f'python{version}', 'site-packages')
+
+
+@pytest.mark.parametrize('version', ['3.9', '3.12'])
+def test_compile_args_optimize(version: str) -> None:
+    "Newer pythons use the compileall -o option"
+    assert bytecode._compile_args(_sdir(version), 2) == [*COMPILEALL, '-o', '2']
+
+
+@pytest.mark.parametrize('optimize, opt', [(1, '-O'), (2, '-OO')])
+def test_compile_args_optimize_old_python(optimize: int, opt: str) -> None:
+    "Older pythons do not have the compileall -o option"
+    assert bytecode._compile_args(_sdir('3.8'), optimize) == [opt, *COMPILEALL]
+
+
+def test_compile_args_no_optimize() -> None:
+    "No optimization needs no options for any python"
+    assert bytecode._compile_args(_sdir('3.8'), 0) == COMPILEALL
+
+
+def test_pyc() -> None:
+    "The pyc file is tagged for the venv python, not ours"
+    src = Path('/venvs/1/lib/python3.10/site-packages/pkg/mod.py')
+    assert bytecode._pyc(src, _sdir('3.10'), 1) == Path(
+        '/venvs/1/lib/python3.10/site-packages/pkg/__pycache__/'
+        'mod.cpython-310.opt-1.pyc'
+    )
+
+
+def test_pyc_pypy() -> None:
+    "PyPy venvs use their own bytecode tag"
+    src = Path('/venvs/1/lib/pypy3.10/site-packages/pkg/mod.py')
+    sdir = Path('/venvs/1/lib/pypy3.10/site-packages')
+    assert bytecode._pyc(src, sdir, 0) == Path(
+        '/venvs/1/lib/pypy3.10/site-packages/pkg/__pycache__/mod.pypy310.pyc'
+    )
+
+
+@pytest.mark.parametrize(
+    'mode',
+    [
+        py_compile.PycInvalidationMode.TIMESTAMP,
+        py_compile.PycInvalidationMode.CHECKED_HASH,
+        py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    ],
+)
+def test_is_current(tmp_path: Path, mode: py_compile.PycInvalidationMode) -> None:
+    "Timestamp and hash based pyc files are current until the source changes"
+    src = tmp_path / 'mod.py'
+    src.write_text('x = 1\n')
+    pyc = tmp_path / 'mod.pyc'
+    assert not bytecode._is_current(src, pyc)
+
+    py_compile.compile(str(src), str(pyc), invalidation_mode=mode)
+    assert bytecode._is_current(src, pyc)
+
+    src.write_text('x = 22\n')
+    assert bytecode._is_current(src, pyc) == (
+        mode == py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
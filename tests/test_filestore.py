@@ -0,0 +1,85 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for deduplicating files across venvs."
+
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from pipxu import filestore
+
+SAME = 'lib/python3.11/site-packages/pkg/data.txt'
+DIFF = 'lib/python3.11/site-packages/pkg/other.txt'
+SOURCE = 'lib/python3.11/site-packages/pkg/mod.py'
+
+
+@pytest.fixture
+def args(tmp_path: Path) -> Namespace:
+    "Return the namespace main() would pass to the command"
+    home = tmp_path / 'home'
+    args = Namespace(
+        _home_dir=home, _venvs_dir=home / 'venvs', _journal_dir=home / 'journal'
+    )
+    args._venvs_dir.mkdir(parents=True)
+    return args
+
+
+def _make_venv(args: Namespace, venv: int, mtime: int) -> Path:
+    "Create a fake venv with files to dedupe"
+    vdir = args._venvs_dir / str(venv)
+    files = {
+        SAME: 'same content',
+        DIFF: f'content {venv}',
+        SOURCE: 'x = 1\n',
+        'bin/script': 'same script',
+        'pipxu_links.txt': 'same links',
+    }
+    for name, text in files.items():
+        path = vdir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        os.utime(path, (mtime, mtime))
+
+    return vdir
+
+
+def _linked(vdir1: Path, vdir2: Path, name: str) -> bool:
+    "Return True if the file is the same inode in both venvs"
+    return (vdir1 / name).stat().st_ino == (vdir2 / name).stat().st_ino
+
+
+def test_dedupe_identical_files(args: Namespace) -> None:
+    "Only files with the same content (and source mtime) are linked"
+    vdir1 = _make_venv(args, 1, 1_000_000)
+    vdir2 = _make_venv(args, 2, 2_000_000)
+
+    stats = filestore.dedupe(args)
+    assert (stats.linked, stats.saved) == (1, len('same content'))
+    assert _linked(vdir1, vdir2, SAME)
+    assert (vdir2 / SAME).read_text() == 'same content'
+    assert not _linked(vdir1, vdir2, DIFF)
+    assert not _linked(vdir1, vdir2, SOURCE)
+    assert not _linked(vdir1, vdir2, 'bin/script')
+    assert not _linked(vdir1, vdir2, 'pipxu_links.txt')
+
+
+def test_dedupe_reuses_index(args: Namespace) -> None:
+    "Files already hashed are not hashed again"
+    vdir1 = _make_venv(args, 1, 1_000_000)
+    _make_venv(args, 2, 1_000_000)
+    stats = filestore.dedupe(args)
+    assert (stats.hashed, stats.linked) == (6, 2)
+
+    stats = filestore.dedupe(args)
+    assert (stats.hashed, stats.linked) == (0, 0)
+
+    # Only the new venv's files are hashed to dedupe it against the others
+    vdir3 = _make_venv(args, 3, 1_000_000)
+    stats = filestore.dedupe(args, [vdir3])
+    assert (stats.hashed, stats.linked) == (3, 2)
+    assert _linked(vdir1, vdir3, SAME)
+    assert _linked(vdir1, vdir3, SOURCE)
+    assert not _linked(vdir1, vdir3, DIFF)
@@ -0,0 +1,45 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for reading installed packages directly from the venv."
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pipxu import utils
+
+# Dist-info files (METADATA headers, direct_url.json) copied from a venv
+# created by uv, and the output of uv pip freeze for that same venv
+DATA = Path(__file__).parent / 'data' / 'freeze'
+
+
+@pytest.fixture(params=['python3.11', 'pypy3.10'])
+def vdir(tmp_path: Path, request: pytest.FixtureRequest) -> Path:
+    "Return a CPython or PyPy venv containing the recorded packages"
+    sdir = tmp_path / 'lib' / request.param / 'site-packages'
+    shutil.copytree(DATA / 'site-packages', sdir)
+    return tmp_path
+
+
+def test_freeze_matches_uv(vdir: Path) -> None:
+    "Editable, local dir, and oddly named packages are frozen as uv does"
+    assert utils.freeze(vdir) == (DATA / 'freeze.txt').read_text().rstrip('\n')
+
+
+def test_get_versions(vdir: Path) -> None:
+    "Names are normalized and editable packages report their location"
+    assert utils.get_versions(vdir) == {
+        'mixed-case-proj': ('1.2.0', '/tmp/golden/Mixed.Case_Proj'),
+        'other-local-dir': ('1.2.0', None),
+        'pyyaml': ('6.0.3', None),
+        'typing-extensions': ('4.16.0', None),
+        'zope-interface': ('8.6', None),
+    }
+
+
+@pytest.mark.parametrize('name', ['Zope.Interface', 'zope_interface', 'ZOPE-interface'])
+def test_get_versions_of_package(vdir: Path, name: str) -> None:
+    "A single package can be found by any form of its name"
+    assert utils.get_versions(vdir, name) == {'zope-interface': ('8.6', None)}
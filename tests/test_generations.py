@@ -0,0 +1,168 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for retained venv generations and rollback."
+
+from __future__ import annotations
+
+import os
+import shutil
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from pipxu import generations, utils
+from pipxu.commands import rollback
+
+APP = 'app'
+
+
+@pytest.fixture
+def args(tmp_path: Path) -> Namespace:
+    "Return the namespace main() would pass to a command"
+    home = tmp_path / 'home'
+    args = Namespace(
+        _home_dir=home,
+        _lockfile=home / '.pipxu.lock',
+        _journal_dir=home / 'journal',
+        _packages_dir=home / 'packages',
+        _venvs_dir=home / 'venvs',
+        _bin_dir=tmp_path / 'bin',
+        _man_dir=tmp_path / 'man',
+        _meta_file='pipxu_metadata.json',
+        _freeze_file='pipxu_freeze.txt',
+        _links_file='pipxu_links.txt',
+        _keep_generations=2,
+        _defer_compile=False,
+        no_man_pages=True,
+        verbose=False,
+    )
+    for d in (args._packages_dir, args._venvs_dir, args._bin_dir):
+        d.mkdir(parents=True)
+    return args
+
+
+def _set_version(vdir: Path, version: str) -> None:
+    "Install the given version of the app in the venv, as uv would"
+    sdir = vdir / 'lib' / 'python3.11' / 'site-packages'
+    for ddir in sdir.glob(f'{APP}-*.dist-info'):
+        shutil.rmtree(ddir)
+
+    ddir = sdir / f'{APP}-{version}.dist-info'
+    ddir.mkdir(parents=True)
+    (ddir / 'METADATA').write_text(f'Name: {APP}\nVersion: {version}\n\n')
+    (ddir / 'RECORD').write_text(f'../../../bin/{APP},,\n')
+
+    # New files are always written, never modified in place
+    script = utils.vdir_bin(vdir) / APP
+    script.parent.mkdir(exist_ok=True)
+    script.unlink(missing_ok=True)
+    script.write_text(f'#!{vdir}/bin/python\n# {version}\n')
+    script.chmod(0o755)
+
+
+def _install(args: Namespace, version: str) -> Path:
+    "Install the app in a new venv, return the venv"
+    with utils.new_vdir(args) as vdir:
+        _set_version(vdir, version)
+        assert utils.make_links(vdir, APP, args, {'deps': False}) is None
+        generations.switch(args, APP, vdir)
+
+    return vdir
+
+
+def _upgrade(args: Namespace, version: str, commit: bool = True) -> Path:
+    "Upgrade the app to the given version, return the venv used"
+    vdir = (args._packages_dir / APP).resolve()
+    with generations.stage(args, APP, vdir) as wvdir:
+        _set_version(wvdir, version)
+        assert utils.make_links(wvdir, APP, args, None) is None
+        if commit:
+            generations.switch(args, APP, wvdir)
+
+    return wvdir
+
+
+def _current(args: Namespace) -> tuple[Path, str]:
+    "Return the current venv of the app and the version its link runs"
+    vdir = (args._packages_dir / APP).resolve()
+    return vdir, (args._bin_dir / APP).read_text().splitlines()[1]
+
+
+def test_clone_does_not_change_original(tmp_path: Path) -> None:
+    "Changing a clone leaves the original venv intact"
+    src = tmp_path / 'src'
+    _set_version(src, '1.0')
+    dst = tmp_path / 'dst'
+    generations._clone(src, dst)
+
+    # Scripts in the clone refer to the clone
+    assert (dst / 'bin' / APP).read_text().startswith(f'#!{dst}/bin/python')
+    assert (dst / 'bin' / APP).stat().st_mode & 0o777 == 0o755
+
+    _set_version(dst, '2.0')
+    assert utils.get_versions(src) == {APP: ('1.0', None)}
+    assert utils.get_versions(dst) == {APP: ('2.0', None)}
+    assert (src / 'bin' / APP).read_text() == f'#!{src}/bin/python\n# 1.0\n'
+
+
+def test_write_text(tmp_path: Path) -> None:
+    "Files are written as new files, and nothing is left on error"
+    src = tmp_path / 'src'
+    src.write_text('old')
+    dst = tmp_path / 'dst'
+    os.link(src, dst)
+
+    utils._write_text(dst, 'new')
+    assert (src.read_text(), dst.read_text()) == ('old', 'new')
+
+    with pytest.raises(UnicodeEncodeError):
+        utils._write_text(dst, '\udc00')
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['dst', 'src']
+
+
+def test_stage_switch_retains_generation(args: Namespace) -> None:
+    "A committed change keeps the previous venv as a generation"
+    old = _install(args, '1.0')
+    new = _upgrade(args, '2.0')
+
+    assert new != old
+    assert _current(args) == (new, '# 2.0')
+    assert [g.resolve() for g in generations.get(args, APP)] == [old]
+    assert utils.get_versions(old) == {APP: ('1.0', None)}
+    assert (old / 'bin' / APP).read_text() == f'#!{old}/bin/python\n# 1.0\n'
+
+
+def test_stage_without_switch_is_discarded(args: Namespace) -> None:
+    "An uncommitted change is removed and the app is left as it was"
+    old = _install(args, '1.0')
+    new = _upgrade(args, '2.0', commit=False)
+
+    assert not new.exists()
+    assert _current(args) == (old, '# 1.0')
+    assert generations.get(args, APP) == []
+
+
+def test_generations_are_evicted(args: Namespace) -> None:
+    "Only the configured number of generations are kept"
+    vdirs = [_install(args, '1.0')]
+    vdirs += [_upgrade(args, f'{n}.0') for n in range(2, 5)]
+
+    assert [g.resolve() for g in generations.get(args, APP)] == vdirs[2:0:-1]
+    assert not vdirs[0].exists()
+
+
+def test_rollback(args: Namespace) -> None:
+    "Rollback switches to the previous venv, and can itself be rolled back"
+    old = _install(args, '1.0')
+    new = _upgrade(args, '2.0')
+    args.package = APP
+    args.list = False
+    args.generation = 1
+
+    assert rollback.main(args) is None
+    assert _current(args) == (old, '# 1.0')
+    assert [g.resolve() for g in generations.get(args, APP)] == [new]
+
+    assert rollback.main(args) is None
+    assert _current(args) == (new, '# 2.0')
+    assert [g.resolve() for g in generations.get(args, APP)] == [old]
@@ -0,0 +1,48 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for querying package indexes."
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from pipxu import index
+
+FILES = [
+    ('pkg-1.0-py3-none-any.whl', None),
+    ('pkg-2.0.tar.gz', '>=3.8'),
+    ('pkg-3.0-py3-none-any.whl', '>=3.12'),
+    ('pkg-4.0-py3-none-any.whl', 'not valid'),
+]
+
+
+def _json() -> str:
+    "Return a PEP 691 JSON page of the files"
+    files = [{'filename': f, 'requires-python': r} for f, r in FILES]
+    return json.dumps({'files': files})
+
+
+def _html() -> str:
+    "Return a PEP 503 HTML page of the files"
+    links = []
+    for f, r in FILES:
+        attr = f' data-requires-python="{r.replace(">", "&gt;")}"' if r else ''
+        links.append(f'<a href="{f}"{attr}>{f}</a>')
+    return '<html><body>' + '\n'.join(links) + '</body></html>'
+
+
+@pytest.mark.parametrize(
+    'body, content_type',
+    [(_json(), 'application/vnd.pypi.simple.v1+json'), (_html(), 'text/html')],
+)
+def test_parse_requires_python(body: str, content_type: str) -> None:
+    "Versions which do not support the python are excluded"
+    assert index._parse(body, content_type, 'pkg') == ['1.0', '2.0', '3.0', '4.0']
+    assert index._parse(body, content_type, 'pkg', '3.11.7') == ['1.0', '2.0', '4.0']
+    assert index._parse(body, content_type, 'pkg', '3.12.0') == [
+        '1.0',
+        '2.0',
+        '3.0',
+        '4.0',
+    ]
@@ -0,0 +1,29 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for the -j/--jobs option of commands."
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+
+import pytest
+
+from pipxu import utils
+
+
+def _parser() -> ArgumentParser:
+    "Return a parser with a jobs option"
+    parser = ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=utils.positive_int)
+    return parser
+
+
+def test_jobs_accepts_positive() -> None:
+    "A positive number of jobs is accepted"
+    assert _parser().parse_args(['-j', '3']).jobs == 3
+
+
+@pytest.mark.parametrize('value', ['0', '-1', 'x', '1.5'])
+def test_jobs_rejects_others(value: str) -> None:
+    "Zero, negative, and non-integer numbers of jobs are rejected"
+    with pytest.raises(SystemExit):
+        _parser().parse_args(['-j', value])
@@ -0,0 +1,33 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for the journal of operations on venvs."
+
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+from pathlib import Path
+
+from pipxu import utils
+
+
+def test_add_journal(tmp_path: Path) -> None:
+    "A journal entry records its venv and is alive while we are"
+    args = Namespace(_journal_dir=tmp_path / 'journal')
+    jfile = utils._add_journal(args, tmp_path / 'venvs' / '7')
+
+    assert jfile.name == f'{os.getpid()}-7'
+    assert list(utils.get_journal(args)) == [(jfile, tmp_path / 'venvs' / '7', True)]
+
+
+def test_get_journal_skips_unreadable(tmp_path: Path) -> None:
+    "Entries being written or removed by other processes are skipped"
+    args = Namespace(_journal_dir=tmp_path / 'journal')
+    args._journal_dir.mkdir()
+    (args._journal_dir / '.1-2.3-4.tmp').write_text('')
+    (args._journal_dir / '1-2').mkdir()
+    jfile = args._journal_dir / '1-3'
+    jfile.write_text('/venvs/3')
+
+    assert [(j, v) for j, v, _ in utils.get_journal(args)] == [
+        (jfile, Path('/venvs/3'))
+    ]
@@ -0,0 +1,71 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for shared dependency layers."
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from pipxu import layers, utils
+
+
+def test_named_pins_excludes_unnamed() -> None:
+    "Editable, path, and URL pins can not be used as uv constraints"
+    pins = [
+        '-e file:///tmp/x',
+        'certifi==2024.2.2',
+        'lproj @ file:///tmp/lproj',
+        './pkg',
+        'Typing_Extensions==4.9.0',
+        'zope.interface==6.2',
+    ]
+    assert layers.named_pins(pins) == [
+        'certifi==2024.2.2',
+        'Typing_Extensions==4.9.0',
+        'zope.interface==6.2',
+    ]
+
+
+def _make_venv(path: Path) -> Path:
+    "Create a minimal venv tree, return its site-packages dir"
+    sdir = path / 'lib' / 'python3.11' / 'site-packages'
+    sdir.mkdir(parents=True)
+    return sdir
+
+
+def test_attach_does_not_change_hard_links(tmp_path: Path) -> None:
+    "Repointing a venv's layer must not change other venvs linked to it"
+    old = _make_venv(tmp_path / 'old')
+    new = _make_venv(tmp_path / 'new')
+    line = utils.layer_pth_line(Path('/layers/a/lib/python3.11/site-packages'))
+    (old / utils.LAYER_PTH).write_text(line)
+    os.link(old / utils.LAYER_PTH, new / utils.LAYER_PTH)
+
+    ldir = tmp_path / 'layer'
+    _make_venv(ldir)
+    layers._attach(tmp_path / 'new', ldir)
+
+    assert layers.get_layer(tmp_path / 'new') == ldir
+    assert (old / utils.LAYER_PTH).read_text() == line
+
+
+def test_layer_pth_files_are_processed(tmp_path: Path) -> None:
+    "Python processes .pth files in the layer, e.g. for namespace packages"
+    sdir = _make_venv(tmp_path / 'venv')
+    ldir = tmp_path / "layer's"
+    lsdir = _make_venv(ldir)
+    extra = tmp_path / 'extra'
+    (lsdir / 'extra.pth').write_text(f'{extra}\n')
+    extra.mkdir()
+    layers._attach(tmp_path / 'venv', ldir)
+
+    assert layers.get_layer(tmp_path / 'venv') == ldir
+    code = (
+        'import site, sys; site.addsitedir(sys.argv[1]); print(sys.argv[2] in sys.path)'
+    )
+    out = subprocess.check_output(
+        [sys.executable, '-S', '-c', code, str(sdir), str(extra)], text=True
+    )
+    assert out.strip() == 'True'
@@ -0,0 +1,82 @@
+# Author: Mark Blakeney, Feb 2024.
+"Tests for planning the changes to sync to a manifest."
+
+from __future__ import annotations
+
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from pipxu.commands import export, sync
+
+
+def _pkg(venvs: Path, venv: int, name: str, version: str, **data) -> dict:
+    "Return a registry entry for a package installed in a fake venv"
+    vdir = venvs / str(venv)
+    vdir.mkdir(parents=True)
+    (vdir / 'pipxu_freeze.txt').write_text(f'dep==1.0\n{name}=={version}\n')
+    return {'venv': venv, 'data': {'name': name, 'deps': False, **data}}
+
+
+@pytest.fixture
+def args(tmp_path: Path) -> Namespace:
+    "Return the namespace main() would pass to the command"
+    return Namespace(
+        _venvs_dir=tmp_path / 'venvs', _freeze_file='pipxu_freeze.txt', no_remove=False
+    )
+
+
+@pytest.fixture
+def pkgs(args: Namespace) -> dict[str, dict]:
+    "Return the registry of installed packages"
+    venvs = args._venvs_dir
+    return {
+        'aaa': _pkg(venvs, 1, 'aaa', '1.0'),
+        'bbb': _pkg(venvs, 2, 'bbb', '2.0', injected=['ccc==1.0', 'ddd']),
+        'eee': _pkg(venvs, 3, 'eee', '3.0', python='3.11'),
+    }
+
+
+def test_plan_synced(args: Namespace, pkgs: dict[str, dict]) -> None:
+    "Nothing is done to sync to the manifest exported from the same apps"
+    assert sync._plan(args, export.get_manifest(args, pkgs), pkgs) == {}
+
+
+def test_plan(args: Namespace, pkgs: dict[str, dict]) -> None:
+    "Each app gets only the change it needs"
+    apps = export.get_manifest(args, pkgs)
+    apps['aaa']['version'] = '1.1'
+    apps['bbb']['injected'] = ['Ccc==2.0']
+    apps['eee']['python'] = '3.12'
+    apps['fff'] = {'deps': False}
+    apps['ggg'] = apps.pop('eee')
+
+    assert sync._plan(args, apps, pkgs) == {
+        'aaa': ('update', '1.0 -> 1.1'),
+        'bbb': ('update', 'inject Ccc==2.0, uninject ddd'),
+        'eee': ('uninstall', 'uninstall'),
+        'fff': ('install', 'install'),
+        'ggg': ('install', 'install'),
+    }
+
+    apps['eee'] = apps.pop('ggg')
+    args.no_remove = True
+    del apps['aaa']
+    assert sync._plan(args, apps, pkgs) == {
+        'bbb': ('update', 'inject Ccc==2.0, uninject ddd'),
+        'eee': ('reinstall', 'reinstall, python changed'),
+        'fff': ('install', 'install'),
+    }
+
+
+def test_plan_editable(args: Namespace, pkgs: dict[str, dict]) -> None:
+    "The version of an editable app is not compared"
+    pkgs['aaa']['data']['editpath'] = '/src/aaa'
+    apps = export.get_manifest(args, pkgs)
+    assert 'version' not in apps['aaa']
+    apps['aaa']['editpath'] = '~/src/aaa'
+
+    assert sync._plan(args, apps, pkgs) == {
+        'aaa': ('reinstall', 'reinstall, editpath changed')
+    }